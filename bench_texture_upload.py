@@ -0,0 +1,136 @@
+import argparse
+import os
+import sys
+import time
+
+# -------------------------------
+# Benchmark for the feed texture upload paths in dome_texture.TextureStream.
+# For every pixel path (bgr / rgb / yuyv) and upload mode (direct / pbo) it
+# streams synthetic camera frames into a texture, draws a full-screen quad
+# with it, and reports the bytes our code copies on the CPU per frame (flip,
+# cvtColor, tobytes, PBO memcpy; the driver's own copy is not counted) plus
+# wall and CPU time per frame. "yuyv" uploads packed YUYV and converts in the
+# shader; "yuyv-cpu" converts the same frames with cv2.cvtColor first. On a
+# software renderer such as llvmpipe the shader also runs on the CPU, so the
+# CPU column then includes the conversion either way.
+#
+#   python bench_texture_upload.py               (opens a small pygame window)
+#   python bench_texture_upload.py --headless    (EGL surfaceless, e.g. Mesa llvmpipe)
+# -------------------------------
+parser = argparse.ArgumentParser(description="Benchmark feed texture upload paths")
+parser.add_argument("--headless", action="store_true",
+                    help="create an EGL surfaceless context instead of a window")
+parser.add_argument("--frames", type=int, default=120)
+parser.add_argument("--sizes", default="640x480,1280x720")
+args = parser.parse_args()
+
+if args.headless:
+    # Must be chosen before PyOpenGL is imported.
+    os.environ["PYOPENGL_PLATFORM"] = "egl"
+    os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+import cv2
+import numpy as np
+from OpenGL.GL import *
+from dome_sources import bgr_to_yuyv
+from dome_texture import TextureStream
+
+PIXEL_PATHS = [("rgb", "direct"), ("rgb", "pbo"), ("bgr", "direct"), ("bgr", "pbo"),
+               ("yuyv", "direct"), ("yuyv", "pbo"), ("yuyv-cpu", "direct")]
+
+# -------------------------------
+# Create a GL context of the given size: EGL pbuffer when headless,
+# otherwise a pygame window.
+# -------------------------------
+def create_context(width, height):
+    if args.headless:
+        import ctypes
+        from OpenGL import EGL
+        display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor))
+        attribs = (EGL.EGLint * 11)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                                    EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8,
+                                    EGL.EGL_BLUE_SIZE, 8,
+                                    EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+                                    EGL.EGL_NONE)
+        config = EGL.EGLConfig()
+        count = EGL.EGLint()
+        EGL.eglChooseConfig(display, attribs, ctypes.pointer(config), 1, ctypes.pointer(count))
+        surface_attribs = (EGL.EGLint * 5)(EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height,
+                                              EGL.EGL_NONE)
+        surface = EGL.eglCreatePbufferSurface(display, config, surface_attribs)
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+        EGL.eglMakeCurrent(display, surface, surface, context)
+    else:
+        import pygame
+        from pygame.locals import DOUBLEBUF, OPENGL
+        pygame.init()
+        pygame.display.set_mode((width, height), DOUBLEBUF | OPENGL)
+    print("Renderer:", glGetString(GL_RENDERER).decode(), "/", glGetString(GL_VERSION).decode())
+
+# -------------------------------
+# Textured quad covering a width x height viewport.
+# -------------------------------
+def draw_quad(stream, width, height):
+    glViewport(0, 0, width, height)
+    glEnable(GL_TEXTURE_2D)
+    stream.bind()
+    glBegin(GL_QUADS)
+    for s, t in ((0, 0), (1, 0), (1, 1), (0, 1)):
+        glTexCoord2f(s, t)
+        glVertex2f(2 * s - 1, 2 * t - 1)
+    glEnd()
+    stream.unbind()
+    glDisable(GL_TEXTURE_2D)
+
+# -------------------------------
+# Stream and draw args.frames distinct frames through one TextureStream.
+# -------------------------------
+def run(width, height, pixel_path, upload_mode):
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(4)]
+    if pixel_path.startswith("yuyv"):
+        frames = [bgr_to_yuyv(frame) for frame in frames]
+    convert = pixel_path == "yuyv-cpu"
+    stream = TextureStream(pixel_path="rgb" if pixel_path == "rgb" else "bgr",
+                           upload_mode=upload_mode)
+    stream.update(frames[0], 0)
+    draw_quad(stream, width, height)
+    glFinish()
+    copied_before = stream.bytes_copied
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for i in range(1, args.frames + 1):
+        frame = frames[i % len(frames)]
+        if convert:
+            frame = cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_YUYV)
+            stream.bytes_copied += frame.nbytes
+        stream.update(frame, i)
+        draw_quad(stream, width, height)
+    glFinish()
+    wall = (time.perf_counter() - wall_start) / args.frames
+    cpu = (time.process_time() - cpu_start) / args.frames
+    copied = (stream.bytes_copied - copied_before) / args.frames
+    mode = stream.stats()
+    stream.release()
+    path = pixel_path if convert else mode["pixel_path"]
+    return path, mode["mode"], frames[0].nbytes, copied, wall, cpu
+
+def main():
+    sizes = [[int(v) for v in size.split("x")] for size in args.sizes.split(",")]
+    create_context(max(w for w, h in sizes), max(h for w, h in sizes))
+    print("%-10s %-8s %-7s %14s %14s %10s %10s" % ("size", "path", "upload", "bytes/frame",
+                                                   "frame bytes", "wall ms", "cpu ms"))
+    for width, height in sizes:
+        for pixel_path, upload_mode in PIXEL_PATHS:
+            path, mode, frame_bytes, copied, wall, cpu = run(width, height, pixel_path,
+                                                             upload_mode)
+            print("%-10s %-8s %-7s %14d %14d %10.3f %10.3f" % ("%dx%d" % (width, height),
+                                                               path, mode, copied, frame_bytes,
+                                                               wall * 1000.0, cpu * 1000.0))
+    sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,49 @@ from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import math
-import random
+import os
+from dome_capture import FrameStages, LatestFrameReader, SourceOpener, StartupTimeline, feed_footprint
+from dome_mesh import DomeLOD, DomeScenery
+from dome_redraw import RedrawScheduler
+from dome_sources import open_recorder
+from dome_texture import TextureStream
+from dome_trajectories import TrajectoryBatch, TrajectoryStore, dot_grid, screen_transform
+
+# Milestones from process start to the first live camera frame on screen.
+startup = StartupTimeline()
+startup.mark("imports")
 
 # Window dimensions
 window_width = 1280
 window_height = 720
 
-# Initialize video capture (webcam)
-cap = cv2.VideoCapture(1)
+# Initialize video capture (webcam). It opens in the background, so the window
+# comes up at once and shows a placeholder until the first frame arrives.
+# DOME_CAMERA picks another frame source, e.g. "synthetic" or "replay:session.npy".
+camera_source = os.environ.get("DOME_CAMERA", "device:1")
+cap = SourceOpener(camera_source, name="webcam", timeline=startup)
+# DOME_RECORD=session.npy also records the raw frames for replay.
+camera_recorder = open_recorder(os.environ.get("DOME_RECORD"))
+feed = LatestFrameReader(cap, name="webcam", recorder=camera_recorder, timeline=startup)  # Capture thread; the render loop never calls cap.read()
 texture_id = None  # Global texture id for webcam feed
+feed_texture = TextureStream(mipmaps=True)  # Allocated once, updated with glTexSubImage2D
+adaptive_feed_resolution = True  # Downscale webcam frames to their on-screen size
+# DOME_TESSELLATION picks the dome mesh: "latlong" (default), "icosphere", or
+# "patches" for the old square patches, which leave the rim open.
+dome_tessellation = os.environ.get("DOME_TESSELLATION", "latlong")
+dome_lod = DomeLOD(dome_tessellation)  # Level of detail follows the camera distance
+frame_stages = FrameStages()  # Per-frame time breakdown, printed on exit
+dome_scenery = DomeScenery(stages=frame_stages)  # Base circle, spokes and apex arrays
+# DOME_DOT_GRID sets the number of dots per side of the base grid.
+# DOME_RESELECT_SECONDS keeps the same 10 trajectories on screen for that
+# long; by default new ones are picked each time the animation restarts.
+dots_per_side = int(os.environ.get("DOME_DOT_GRID", "20"))
+# DOME_CURVE_TOLERANCE is how far (in pixels) a trajectory polyline may
+# stray from the true curve on screen.
+curve_tolerance = float(os.environ.get("DOME_CURVE_TOLERANCE", "0.25"))
+trajectory_reselect = float(os.environ.get("DOME_RESELECT_SECONDS", "0")) or None
+last_progress = 0.0
+trajectory_batch = TrajectoryBatch()  # All trajectories in one glMultiDrawArrays call
 
 # Global variables for rotation, zoom, and camera control
 dome_rotation = 0.0
@@ -83,22 +117,14 @@ class Slider:
 # Returns False if no frame is available.
 # -------------------------------
 def load_texture():
-    global texture_id, cap
-    ret, frame = cap.read()
-    if not ret:
+    global texture_id
+    # Take the newest frame published by the capture thread.
+    captured = feed.latest()
+    if captured is None:
         return False
-    frame = cv2.flip(frame, 0)
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    frame_data = frame.tobytes()
-    if texture_id is None:
-        texture_id = glGenTextures(1)
-        if isinstance(texture_id, (list, tuple)):
-            texture_id = texture_id[0]
-    glBindTexture(GL_TEXTURE_2D, texture_id)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, frame.shape[1], frame.shape[0],
-                 0, GL_RGB, GL_UNSIGNED_BYTE, frame_data)
+    # Upload only when the frame is new; storage is reallocated only when the resolution changes.
+    feed_texture.update(captured.image, captured.seq)
+    texture_id = feed_texture.texture_id
     return True
 
 # -------------------------------
@@ -106,111 +132,81 @@ def load_texture():
 # Maps the live webcam feed texture into a circular area.
 # -------------------------------
 def draw_textured_circle(radius, slices=100):
-    glBegin(GL_TRIANGLE_FAN)
-    glTexCoord2f(0.5, 0.5)
-    glVertex3f(0, 0, 0)
-    for i in range(slices+1):
-        angle = 2 * math.pi * i / slices
-        tx = 0.5 + 0.5 * math.cos(angle)
-        ty = 0.5 + 0.5 * math.sin(angle)
-        glTexCoord2f(tx, ty)
-        glVertex3f(radius * math.cos(angle), 0, radius * math.sin(angle))
-    glEnd()
+    dome_scenery.draw_base(radius, slices)
+
+# -------------------------------
+# Launch and control points for the selected dots' trajectories.
+# u in [0, 1) is the dot's persistent random number; it picks the entry
+# angle alpha in [20°, 85°].
+# -------------------------------
+def launch_points(p_end, u, dome_radius, parabola_range, parabola_height):
+    mag = np.hypot(p_end[:, 0], p_end[:, 2])
+    direction = p_end / mag[:, None]
+    H = parabola_range
+    alpha = math.radians(20) + u * (math.radians(85) - math.radians(20))
+    p0 = p_end + direction * H
+    p0[:, 1] = H * np.tan(alpha)
+    p_control = (p0 + p_end) / 2.0
+    p_control[:, 1] += parabola_height
+    return p0, p_control
+
+trajectory_store = TrajectoryStore(launch_points, sample=10, reselect_interval=trajectory_reselect)  # Seeded trajectories, kept between frames
 
 # -------------------------------
 # Draw the webcam feed as a textured circle and overlay grid & trajectories.
 # Only dots inside the dome base circle are drawn.
-# Instead of drawing for every dot, 10 random dots are chosen.
+# Instead of drawing for every dot, 10 random dots are chosen (see
+# trajectory_store).
 # The trajectories animate gradually with progress from get_traj_progress().
 # -------------------------------
 def draw_camera_feed(dome_radius, parabola_range, parabola_height):
+    global last_progress
     glPushMatrix()
     glTranslatef(0, 0, 0)
     
     # Draw live webcam feed inside a circle.
     glEnable(GL_TEXTURE_2D)
-    if load_texture():
-        glBindTexture(GL_TEXTURE_2D, texture_id)
-        glColor3f(1, 1, 1)
-        draw_textured_circle(dome_radius, slices=100)
+    load_texture()
+    feed_texture.bind()  # Placeholder pattern until the first frame arrives
+    glColor3f(1, 1, 1)
+    draw_textured_circle(dome_radius, slices=100)
+    feed_texture.unbind()
     glDisable(GL_TEXTURE_2D)
     
-    # Draw a 20x20 grid of red dots inside the circle.
+    # Draw a grid of red dots inside the circle.
     glPointSize(5)
     glColor3f(1, 0, 0)
-    glBegin(GL_POINTS)
     side = dome_radius * math.sqrt(2)
-    for i in range(20):
-        for j in range(20):
-            dot_x = -side/2 + (i + 0.5) * (side/20)
-            dot_z = -side/2 + (j + 0.5) * (side/20)
-            if dot_x**2 + dot_z**2 <= dome_radius**2:
-                glVertex3f(dot_x, 0.001, dot_z)
-    glEnd()
+    dots = dot_grid(side, dots_per_side)
+    inside_circle = dots[:, 0]**2 + dots[:, 2]**2 <= dome_radius**2
+    raised = dots[inside_circle]
+    raised[:, 1] = 0.001
+    trajectory_batch.draw_points(raised)
     
-    # Gather valid dot positions (inside the circle).
-    valid_dots = []
-    for i in range(20):
-        for j in range(20):
-            dot_x = -side/2 + (i + 0.5) * (side/20)
-            dot_z = -side/2 + (j + 0.5) * (side/20)
-            if dot_x**2 + dot_z**2 <= dome_radius**2:
-                valid_dots.append((dot_x, dot_z))
-    if len(valid_dots) > 10:
-        selected_dots = random.sample(valid_dots, 10)
-    else:
-        selected_dots = valid_dots
-    
-    # Draw trajectories for the selected 10 dots.
-    glLineWidth(2)
-    num_segments = 30
     # Use get_traj_progress() to animate the drawing.
     progress = get_traj_progress()
-    max_segment = int(progress * num_segments)
+    if progress < last_progress and trajectory_reselect is None:
+        trajectory_store.reselect()
+    last_progress = progress
     
-    for (dot_x, dot_z) in selected_dots:
-        p_end = (dot_x, 0, dot_z)
-        mag = math.sqrt(dot_x**2 + dot_z**2)
-        if mag < 1e-3:
-            continue
-        dir_x = dot_x / mag
-        dir_z = dot_z / mag
-        H = parabola_range  
-        alpha = random.uniform(math.radians(20), math.radians(85))
-        vertical_offset = H * math.tan(alpha)
-        p0 = (dot_x + dir_x * H, vertical_offset, dot_z + dir_z * H)
-        p_control = ((p0[0] + p_end[0]) / 2.0,
-                     (p0[1] + p_end[1]) / 2.0 + parabola_height,
-                     (p0[2] + p_end[2]) / 2.0)
-        
-        glBegin(GL_LINE_STRIP)
-        for k in range(max_segment + 1):
-            t = k / float(num_segments)
-            bx = (1-t)**2 * p0[0] + 2*(1-t)*t * p_control[0] + t**2 * p_end[0]
-            by = (1-t)**2 * p0[1] + 2*(1-t)*t * p_control[1] + t**2 * p_end[1]
-            bz = (1-t)**2 * p0[2] + 2*(1-t)*t * p_control[2] + t**2 * p_end[2]
-            if bx**2 + by**2 + bz**2 <= dome_radius**2:
-                glColor3f(1, 0, 0) if progress > 0.95 and (int(pygame.time.get_ticks()/200) % 2 == 0) else glColor3f(0.5, 0, 0)
-            else:
-                glColor3f(0, 1, 0)
-            glVertex3f(bx, by, bz)
-        glEnd()
-        
-        glColor3f(1, 1, 0)
-        glBegin(GL_LINES)
-        glVertex3f(0, 0, 0)
-        glVertex3f(p_end[0], p_end[1], p_end[2])
-        glEnd()
+    # Valid dots are inside the circle (and not at its centre). The store
+    # keeps a random subset of 10 until it is re-chosen.
+    valid = inside_circle & (np.hypot(dots[:, 0], dots[:, 2]) >= 1e-3)
+    trajectory_store.update(dots, valid, dome_radius, parabola_range, parabola_height)
+    
+    # Draw trajectories for the selected 10 dots, up to the animation progress.
+    glLineWidth(2)
+    blink = progress > 0.95 and (int(pygame.time.get_ticks()/200) % 2 == 0)
+    strips = trajectory_store.tessellate(screen_transform(), curve_tolerance, t_end=progress)
+    trajectory_batch.draw_strips(*strips, (1, 0, 0) if blink else (0.5, 0, 0))
     
     glColor3f(1, 1, 0)
-    glBegin(GL_LINES)
-    for angle in range(0, 360, 15):
-        rad = math.radians(angle)
-        x = dome_radius * math.cos(rad)
-        z = dome_radius * math.sin(rad)
-        glVertex3f(0, 0, 0)
-        glVertex3f(x, 0, z)
-    glEnd()
+    center_lines = np.zeros((len(trajectory_store.selected), 2, 3), dtype=np.float32)
+    center_lines[:, 1] = trajectory_store.end_points()
+    trajectory_batch.draw_lines(center_lines.reshape(-1, 3))
+    
+    glColor3f(1, 1, 0)
+    dome_scenery.draw_spokes(dome_radius)
     
     glPopMatrix()
 
@@ -218,30 +214,11 @@ def draw_camera_feed(dome_radius, parabola_range, parabola_height):
 # Draw the dome as square patches (upper hemisphere) with transparency.
 # -------------------------------
 def draw_dome_square_patches(dome_radius, grid):
-    dx = (2 * dome_radius) / grid
     glEnable(GL_BLEND)
     glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
     glColor4f(0.0, 0.6, 1.0, 0.1)
-    for i in range(grid):
-        for j in range(grid):
-            x0 = -dome_radius + i * dx
-            z0 = -dome_radius + j * dx
-            x1 = x0 + dx
-            z1 = z0 + dx
-            if (x0*x0 + z0*z0 <= dome_radius**2 and
-                x1*x1 + z0*z0 <= dome_radius**2 and
-                x1*x1 + z1*z1 <= dome_radius**2 and
-                x0*x0 + z1*z1 <= dome_radius**2):
-                y0 = math.sqrt(dome_radius**2 - x0*x0 - z0*z0)
-                y1 = math.sqrt(dome_radius**2 - x1*x1 - z0*z0)
-                y2 = math.sqrt(dome_radius**2 - x1*x1 - z1*z1)
-                y3 = math.sqrt(dome_radius**2 - x0*x0 - z1*z1)
-                glBegin(GL_QUADS)
-                glVertex3f(x0, y0, z0)
-                glVertex3f(x1, y1, z0)
-                glVertex3f(x1, y2, z1)
-                glVertex3f(x0, y3, z1)
-                glEnd()
+    # The grid slider caps the detail: the patch grid, or the highest quality level.
+    dome_lod.draw(dome_radius, grid)
     glDisable(GL_BLEND)
 
 # -------------------------------
@@ -262,6 +239,11 @@ def render_scene(dome_radius, grid, parabola_range, parabola_height):
     gluLookAt(cam_x, cam_y, cam_z,
               0, center_y, 0,
               0, 1, 0)
+    # Match the webcam resolution to the base circle's on-screen size.
+    if adaptive_feed_resolution:
+        distance = math.sqrt(cam_x**2 + cam_y**2 + cam_z**2)
+        feed.footprint = feed_footprint(dome_radius, distance, 45, window_height)
+    dome_lod.set_view((cam_x, cam_y, cam_z), dome_rotation, 45, window_height)
     
     glPushMatrix()
     glRotatef(math.degrees(dome_rotation), 0, 1, 0)
@@ -274,9 +256,7 @@ def render_scene(dome_radius, grid, parabola_range, parabola_height):
     glPushMatrix()
     glColor3f(1, 0, 0)
     glPointSize(10)
-    glBegin(GL_POINTS)
-    glVertex3f(0, dome_radius, 0)
-    glEnd()
+    dome_scenery.draw_apex(dome_radius)
     glPopMatrix()
 
 # -------------------------------
@@ -287,7 +267,9 @@ def main():
     global dome_rotation, rotating, prev_mouse_x, zoom_factor, camera_yaw, camera_pitch
     pygame.init()
     pygame.display.set_mode((window_width, window_height), DOUBLEBUF | OPENGL)
+    startup.mark("GL context")
     pygame.display.set_caption("Dome with Live Webcam Feed in Base Circle, Transparent Dome, and 10 Slow Trajectories")
+    feed.start()
     glEnable(GL_DEPTH_TEST)
     glClearColor(0, 0, 0, 1)
     
@@ -300,10 +282,15 @@ def main():
     parabola_slider = Slider(10, 70, 200, 20, 50, 300, 100)
     parabola_height_slider = Slider(10, 100, 200, 20, 10, 200, 50)
     
-    clock = pygame.time.Clock()
+    # Only redraw when the camera, the input or an animation changed something.
+    redraw = RedrawScheduler(max_fps=30)
+    redraw.watch("camera frame", lambda: feed.frames_captured)
+    # The trajectories only blink once they are nearly complete.
+    redraw.watch("blink", lambda: get_traj_progress() > 0.95 and pygame.time.get_ticks() // 200 % 2)
+    redraw.watch("trajectory animation", lambda: int(get_traj_progress() * 30))
     running = True
     while running:
-        for event in pygame.event.get():
+        for event in redraw.events():
             if event.type == QUIT:
                 running = False
             
@@ -350,17 +337,28 @@ def main():
         parabola_range = parabola_slider.value
         parabola_height = parabola_height_slider.value
         
+        if not redraw.due():
+            continue
+
+        frame_stages.frame_begin()
         render_scene(dome_radius, grid, parabola_range, parabola_height)
         pygame.display.flip()
+        frame_stages.frame_end()
+        feed.frame_presented()
+        if feed_texture.uploads and startup.mark("first live texture"):
+            startup.report()
         
         surface = pygame.display.get_surface()
         dome_slider.draw()
         grid_slider.draw()
         parabola_slider.draw()
         parabola_height_slider.draw()
-        
-        clock.tick(30)
     
+    print("Dome LOD:", dome_lod.stats())
+    print("Frame stages (ms):", frame_stages.stats())
+    print("Redraw:", redraw.stats())
+    print("Trajectories:", trajectory_batch.stats(), trajectory_store.stats())
+    feed.stop()
     cap.release()
     pygame.quit()
 
@@ -5,14 +5,38 @@ from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import math
+import os
+from dome_capture import FrameStages, LatestFrameReader, SourceOpener, StartupTimeline, feed_footprint
+from dome_mesh import DomeLOD, DomeScenery
+from dome_redraw import RedrawScheduler
+from dome_sources import open_recorder
+from dome_texture import TextureStream
+
+# Milestones from process start to the first live camera frame on screen.
+startup = StartupTimeline()
+startup.mark("imports")
 
 # Window dimensions
 window_width = 800
 window_height = 600
 
-# Initialize video capture (webcam)
-cap = cv2.VideoCapture(0)
+# Initialize video capture (webcam). It opens in the background, so the window
+# comes up at once and shows a placeholder until the first frame arrives.
+# DOME_CAMERA picks another frame source, e.g. "synthetic" or "replay:session.npy".
+camera_source = os.environ.get("DOME_CAMERA", "device:0")
+cap = SourceOpener(camera_source, name="webcam", timeline=startup)
+# DOME_RECORD=session.npy also records the raw frames for replay.
+camera_recorder = open_recorder(os.environ.get("DOME_RECORD"))
+feed = LatestFrameReader(cap, name="webcam", recorder=camera_recorder, timeline=startup)  # Capture thread; the render loop never calls cap.read()
 texture_id = None  # Global texture id for webcam feed
+feed_texture = TextureStream(mipmaps=True)  # Allocated once, updated with glTexSubImage2D
+adaptive_feed_resolution = True  # Downscale webcam frames to their on-screen size
+# DOME_TESSELLATION picks the dome mesh: "latlong" (default), "icosphere", or
+# "patches" for the old square patches, which leave the rim open.
+dome_tessellation = os.environ.get("DOME_TESSELLATION", "latlong")
+dome_lod = DomeLOD(dome_tessellation)  # Level of detail follows the camera distance
+frame_stages = FrameStages()  # Per-frame time breakdown, printed on exit
+dome_scenery = DomeScenery(stages=frame_stages)  # Base circle, spokes and apex arrays
 
 # Global variables for rotation and zoom
 dome_rotation = 0.0
@@ -64,21 +88,14 @@ class Slider:
 # Update the webcam texture from OpenCV
 # -------------------------------
 def load_texture():
-    global texture_id, cap
-    ret, frame = cap.read()
-    if not ret:
+    global texture_id
+    # Take the newest frame published by the capture thread.
+    captured = feed.latest()
+    if captured is None:
         return
-    # Flip vertically and convert BGR to RGB.
-    frame = cv2.flip(frame, 0)
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    frame_data = frame.tobytes()
-    if texture_id is None:
-        texture_id = glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, texture_id)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, frame.shape[1], frame.shape[0],
-                 0, GL_RGB, GL_UNSIGNED_BYTE, frame_data)
+    # Upload only when the frame is new; storage is reallocated only when the resolution changes.
+    feed_texture.update(captured.image, captured.seq)
+    texture_id = feed_texture.texture_id
 
 # -------------------------------
 # Draw the camera feed as a quad on the ground.
@@ -92,7 +109,7 @@ def draw_camera_feed(dome_radius):
     glTranslatef(0, 0, 0)
     glEnable(GL_TEXTURE_2D)
     load_texture()
-    glBindTexture(GL_TEXTURE_2D, texture_id)
+    feed_texture.bind()  # Placeholder pattern until the first frame arrives
     glColor3f(1, 1, 1)
     glBegin(GL_QUADS)
     glTexCoord2f(0, 0); glVertex3f(-side/2, 0, -side/2)
@@ -100,6 +117,7 @@ def draw_camera_feed(dome_radius):
     glTexCoord2f(1, 1); glVertex3f(side/2, 0, side/2)
     glTexCoord2f(0, 1); glVertex3f(-side/2, 0, side/2)
     glEnd()
+    feed_texture.unbind()
     glDisable(GL_TEXTURE_2D)
     
     # Draw a 20x20 grid of red dots over the camera feed
@@ -120,31 +138,11 @@ def draw_camera_feed(dome_radius):
 # The dome is defined by the hemisphere: x^2 + y^2 + z^2 = R^2, y >= 0.
 # -------------------------------
 def draw_dome_square_patches(dome_radius, grid):
-    dx = (2 * dome_radius) / grid
     glEnable(GL_BLEND)
     glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
     glColor4f(0.0, 0.6, 1.0, 0.3)  # Transparent blue color
-    for i in range(grid):
-        for j in range(grid):
-            x0 = -dome_radius + i * dx
-            z0 = -dome_radius + j * dx
-            x1 = x0 + dx
-            z1 = z0 + dx
-            # Only draw the patch if all four corners lie inside the dome's base circle.
-            if (x0*x0 + z0*z0 <= dome_radius*dome_radius and
-                x1*x1 + z0*z0 <= dome_radius*dome_radius and
-                x1*x1 + z1*z1 <= dome_radius*dome_radius and
-                x0*x0 + z1*z1 <= dome_radius*dome_radius):
-                y0 = math.sqrt(dome_radius*dome_radius - x0*x0 - z0*z0)
-                y1 = math.sqrt(dome_radius*dome_radius - x1*x1 - z0*z0)
-                y2 = math.sqrt(dome_radius*dome_radius - x1*x1 - z1*z1)
-                y3 = math.sqrt(dome_radius*dome_radius - x0*x0 - z1*z1)
-                glBegin(GL_QUADS)
-                glVertex3f(x0, y0, z0)
-                glVertex3f(x1, y1, z0)
-                glVertex3f(x1, y2, z1)
-                glVertex3f(x0, y3, z1)
-                glEnd()
+    # The grid slider caps the detail: the patch grid, or the highest quality level.
+    dome_lod.draw(dome_radius, grid)
     glDisable(GL_BLEND)
 
 # -------------------------------
@@ -166,6 +164,11 @@ def render_scene(dome_radius, grid):
     gluLookAt(cam_x, cam_y, cam_z,
               0, center_y, 0,
               0, 1, 0)
+    # Match the webcam resolution to the base circle's on-screen size.
+    if adaptive_feed_resolution:
+        distance = math.sqrt(cam_x**2 + cam_y**2 + cam_z**2)
+        feed.footprint = feed_footprint(dome_radius, distance, 45, window_height)
+    dome_lod.set_view((cam_x, cam_y, cam_z), dome_rotation, 45, window_height)
 
     # Rotate the dome (controlled by mouse drag, if desired)
     glPushMatrix()
@@ -180,9 +183,7 @@ def render_scene(dome_radius, grid):
     glPushMatrix()
     glColor3f(1, 0, 0)
     glPointSize(10)
-    glBegin(GL_POINTS)
-    glVertex3f(0, dome_radius, 0)
-    glEnd()
+    dome_scenery.draw_apex(dome_radius)
     glPopMatrix()
 
 # -------------------------------
@@ -194,7 +195,9 @@ def main():
     global dome_rotation, rotating, prev_mouse_x, zoom_factor, camera_yaw, camera_pitch
     pygame.init()
     pygame.display.set_mode((window_width, window_height), DOUBLEBUF | OPENGL)
+    startup.mark("GL context")
     pygame.display.set_caption("Dome with Square Patches and Adjustable Grid")
+    feed.start()
     glEnable(GL_DEPTH_TEST)
     glClearColor(0, 0, 0, 1)
     
@@ -206,10 +209,12 @@ def main():
     dome_slider = Slider(10, 10, 200, 20, 100, 400, 300)
     grid_slider = Slider(10, 40, 200, 20, 5, 80, 20)  # Increase grid resolution up to 80 patches
 
-    clock = pygame.time.Clock()
+    # Only redraw when the camera, the input or an animation changed something.
+    redraw = RedrawScheduler(max_fps=30)
+    redraw.watch("camera frame", lambda: feed.frames_captured)
     running = True
     while running:
-        for event in pygame.event.get():
+        for event in redraw.events():
             if event.type == QUIT:
                 running = False
 
@@ -253,16 +258,26 @@ def main():
         dome_radius = dome_slider.value
         grid = int(grid_slider.value)
 
+        if not redraw.due():
+            continue
+
+        frame_stages.frame_begin()
         render_scene(dome_radius, grid)
         pygame.display.flip()
+        frame_stages.frame_end()
+        feed.frame_presented()
+        if feed_texture.uploads and startup.mark("first live texture"):
+            startup.report()
 
         # Draw sliders over the OpenGL view.
         surface = pygame.display.get_surface()
         dome_slider.draw()
         grid_slider.draw()
 
-        clock.tick(30)
-
+    print("Dome LOD:", dome_lod.stats())
+    print("Frame stages (ms):", frame_stages.stats())
+    print("Redraw:", redraw.stats())
+    feed.stop()
     cap.release()
     pygame.quit()
 
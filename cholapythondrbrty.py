@@ -5,15 +5,39 @@ from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import math
+import os
 import random
+from dome_capture import FrameStages, LatestFrameReader, SourceOpener, StartupTimeline, feed_footprint
+from dome_mesh import DomeLOD, DomeScenery
+from dome_redraw import RedrawScheduler
+from dome_sources import open_recorder
+from dome_texture import TextureStream
+
+# Milestones from process start to the first live camera frame on screen.
+startup = StartupTimeline()
+startup.mark("imports")
 
 # Window dimensions
 window_width = 800
 window_height = 600
 
-# Initialize video capture (webcam)
-cap = cv2.VideoCapture(0)
+# Initialize video capture (webcam). It opens in the background, so the window
+# comes up at once and shows a placeholder until the first frame arrives.
+# DOME_CAMERA picks another frame source, e.g. "synthetic" or "replay:session.npy".
+camera_source = os.environ.get("DOME_CAMERA", "device:0")
+cap = SourceOpener(camera_source, name="webcam", timeline=startup)
+# DOME_RECORD=session.npy also records the raw frames for replay.
+camera_recorder = open_recorder(os.environ.get("DOME_RECORD"))
+feed = LatestFrameReader(cap, name="webcam", recorder=camera_recorder, timeline=startup)  # Capture thread; the render loop never calls cap.read()
 texture_id = None  # Global texture id for webcam feed
+feed_texture = TextureStream(mipmaps=True)  # Allocated once, updated with glTexSubImage2D
+adaptive_feed_resolution = True  # Downscale webcam frames to their on-screen size
+# DOME_TESSELLATION picks the dome mesh: "latlong" (default), "icosphere", or
+# "patches" for the old square patches, which leave the rim open.
+dome_tessellation = os.environ.get("DOME_TESSELLATION", "latlong")
+dome_lod = DomeLOD(dome_tessellation)  # Level of detail follows the camera distance
+frame_stages = FrameStages()  # Per-frame time breakdown, printed on exit
+dome_scenery = DomeScenery(stages=frame_stages)  # Base circle, spokes and apex arrays
 
 # Global variables for rotation, zoom, and camera control
 dome_rotation = 0.0
@@ -70,23 +94,14 @@ class Slider:
 # Returns False if no frame is available.
 # -------------------------------
 def load_texture():
-    global texture_id, cap
-    ret, frame = cap.read()
-    if not ret:
+    global texture_id
+    # Take the newest frame published by the capture thread.
+    captured = feed.latest()
+    if captured is None:
         return False
-    # Flip vertically and convert from BGR to RGB.
-    frame = cv2.flip(frame, 0)
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    frame_data = frame.tobytes()
-    if texture_id is None:
-        texture_id = glGenTextures(1)
-        if isinstance(texture_id, (list, tuple)):
-            texture_id = texture_id[0]
-    glBindTexture(GL_TEXTURE_2D, texture_id)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, frame.shape[1], frame.shape[0],
-                 0, GL_RGB, GL_UNSIGNED_BYTE, frame_data)
+    # Upload only when the frame is new; storage is reallocated only when the resolution changes.
+    feed_texture.update(captured.image, captured.seq)
+    texture_id = feed_texture.texture_id
     return True
 
 # -------------------------------
@@ -94,16 +109,7 @@ def load_texture():
 # This maps the live webcam feed texture into a circular area.
 # -------------------------------
 def draw_textured_circle(radius, slices=100):
-    glBegin(GL_TRIANGLE_FAN)
-    glTexCoord2f(0.5, 0.5)
-    glVertex3f(0, 0, 0)
-    for i in range(slices+1):
-        angle = 2 * math.pi * i / slices
-        tx = 0.5 + 0.5 * math.cos(angle)
-        ty = 0.5 + 0.5 * math.sin(angle)
-        glTexCoord2f(tx, ty)
-        glVertex3f(radius * math.cos(angle), 0, radius * math.sin(angle))
-    glEnd()
+    dome_scenery.draw_base(radius, slices)
 
 # -------------------------------
 # Draw the webcam feed as a textured circle and overlay grid & trajectories.
@@ -115,10 +121,11 @@ def draw_camera_feed(dome_radius, parabola_range, parabola_height):
     
     # Draw the live webcam feed within a circle matching the dome base.
     glEnable(GL_TEXTURE_2D)
-    if load_texture():
-        glBindTexture(GL_TEXTURE_2D, texture_id)
-        glColor3f(1, 1, 1)
-        draw_textured_circle(dome_radius, slices=100)
+    load_texture()
+    feed_texture.bind()  # Placeholder pattern until the first frame arrives
+    glColor3f(1, 1, 1)
+    draw_textured_circle(dome_radius, slices=100)
+    feed_texture.unbind()
     glDisable(GL_TEXTURE_2D)
     
     # Draw a 20x20 grid of red dots inside the circle.
@@ -180,14 +187,7 @@ def draw_camera_feed(dome_radius, parabola_range, parabola_height):
             glEnd()
     
     glColor3f(1, 1, 0)
-    glBegin(GL_LINES)
-    for angle in range(0, 360, 15):
-        rad = math.radians(angle)
-        x = dome_radius * math.cos(rad)
-        z = dome_radius * math.sin(rad)
-        glVertex3f(0, 0, 0)
-        glVertex3f(x, 0, z)
-    glEnd()
+    dome_scenery.draw_spokes(dome_radius)
     
     glPopMatrix()
 
@@ -195,31 +195,12 @@ def draw_camera_feed(dome_radius, parabola_range, parabola_height):
 # Draw the dome as square patches (upper hemisphere) with transparency.
 # -------------------------------
 def draw_dome_square_patches(dome_radius, grid):
-    dx = (2 * dome_radius) / grid
     glEnable(GL_BLEND)
     glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
     # Lower alpha (e.g. 0.1) makes the dome more transparent.
     glColor4f(0.0, 0.6, 1.0, 0.1)
-    for i in range(grid):
-        for j in range(grid):
-            x0 = -dome_radius + i * dx
-            z0 = -dome_radius + j * dx
-            x1 = x0 + dx
-            z1 = z0 + dx
-            if (x0*x0 + z0*z0 <= dome_radius**2 and
-                x1*x1 + z0*z0 <= dome_radius**2 and
-                x1*x1 + z1*z1 <= dome_radius**2 and
-                x0*x0 + z1*z1 <= dome_radius**2):
-                y0 = math.sqrt(dome_radius**2 - x0*x0 - z0*z0)
-                y1 = math.sqrt(dome_radius**2 - x1*x1 - z0*z0)
-                y2 = math.sqrt(dome_radius**2 - x1*x1 - z1*z1)
-                y3 = math.sqrt(dome_radius**2 - x0*x0 - z1*z1)
-                glBegin(GL_QUADS)
-                glVertex3f(x0, y0, z0)
-                glVertex3f(x1, y1, z0)
-                glVertex3f(x1, y2, z1)
-                glVertex3f(x0, y3, z1)
-                glEnd()
+    # The grid slider caps the detail: the patch grid, or the highest quality level.
+    dome_lod.draw(dome_radius, grid)
     glDisable(GL_BLEND)
 
 # -------------------------------
@@ -240,6 +221,11 @@ def render_scene(dome_radius, grid, parabola_range, parabola_height):
     gluLookAt(cam_x, cam_y, cam_z,
               0, center_y, 0,
               0, 1, 0)
+    # Match the webcam resolution to the base circle's on-screen size.
+    if adaptive_feed_resolution:
+        distance = math.sqrt(cam_x**2 + cam_y**2 + cam_z**2)
+        feed.footprint = feed_footprint(dome_radius, distance, 45, window_height)
+    dome_lod.set_view((cam_x, cam_y, cam_z), dome_rotation, 45, window_height)
     
     glPushMatrix()
     glRotatef(math.degrees(dome_rotation), 0, 1, 0)
@@ -252,9 +238,7 @@ def render_scene(dome_radius, grid, parabola_range, parabola_height):
     glPushMatrix()
     glColor3f(1, 0, 0)
     glPointSize(10)
-    glBegin(GL_POINTS)
-    glVertex3f(0, dome_radius, 0)
-    glEnd()
+    dome_scenery.draw_apex(dome_radius)
     glPopMatrix()
 
 # -------------------------------
@@ -265,7 +249,9 @@ def main():
     global dome_rotation, rotating, prev_mouse_x, zoom_factor, camera_yaw, camera_pitch
     pygame.init()
     pygame.display.set_mode((window_width, window_height), DOUBLEBUF | OPENGL)
+    startup.mark("GL context")
     pygame.display.set_caption("Dome with Live Webcam Feed in Base Circle & Transparent Dome")
+    feed.start()
     glEnable(GL_DEPTH_TEST)
     glClearColor(0, 0, 0, 1)
     
@@ -278,10 +264,13 @@ def main():
     parabola_slider = Slider(10, 70, 200, 20, 50, 300, 100)
     parabola_height_slider = Slider(10, 100, 200, 20, 10, 200, 50)
     
-    clock = pygame.time.Clock()
+    # Only redraw when the camera, the input or an animation changed something.
+    redraw = RedrawScheduler(max_fps=30)
+    redraw.watch("camera frame", lambda: feed.frames_captured)
+    redraw.watch("blink", lambda: pygame.time.get_ticks() // 200 % 2)
     running = True
     while running:
-        for event in pygame.event.get():
+        for event in redraw.events():
             if event.type == QUIT:
                 running = False
             
@@ -328,17 +317,27 @@ def main():
         parabola_range = parabola_slider.value
         parabola_height = parabola_height_slider.value
         
+        if not redraw.due():
+            continue
+
+        frame_stages.frame_begin()
         render_scene(dome_radius, grid, parabola_range, parabola_height)
         pygame.display.flip()
+        frame_stages.frame_end()
+        feed.frame_presented()
+        if feed_texture.uploads and startup.mark("first live texture"):
+            startup.report()
         
         surface = pygame.display.get_surface()
         dome_slider.draw()
         grid_slider.draw()
         parabola_slider.draw()
         parabola_height_slider.draw()
-        
-        clock.tick(30)
     
+    print("Dome LOD:", dome_lod.stats())
+    print("Frame stages (ms):", frame_stages.stats())
+    print("Redraw:", redraw.stats())
+    feed.stop()
     cap.release()
     pygame.quit()
 
@@ -0,0 +1,757 @@
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from dome_sources import open_source
+
+# -------------------------------
+# A captured frame as handed to the render loop.
+# seq counts up from 1 for every frame the device delivered and
+# timestamp is the time.perf_counter() value taken right after cap.read().
+# source_time is the frame's own timestamp when the source provides one
+# (see dome_sources), otherwise None.
+# -------------------------------
+CapturedFrame = namedtuple("CapturedFrame", ["seq", "timestamp", "image", "source_time"],
+                           defaults=(None,))
+
+# -------------------------------
+# perf_counter() value at which this process started, read from /proc on
+# Linux; elsewhere falls back to the time this module was imported.
+# -------------------------------
+def process_start_time():
+    now = time.perf_counter()
+    try:
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        with open("/proc/self/stat") as f:
+            # Fields after the executable name; starttime is field 22 of the line.
+            fields = f.read().rsplit(")", 1)[1].split()
+        started = float(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return now - (uptime - started)
+    except (OSError, ValueError, IndexError):
+        return now
+
+# -------------------------------
+# Startup timeline: seconds from process start to each named milestone
+# (imports done, GL context, source opened, first frame, first live texture).
+# mark() only records the first occurrence of a name and returns True then.
+# -------------------------------
+class StartupTimeline:
+    def __init__(self):
+        self.origin = process_start_time()
+        self.lock = threading.Lock()
+        self.events = []
+        self.names = set()
+
+    def mark(self, name):
+        with self.lock:
+            if name in self.names:
+                return False
+            self.names.add(name)
+            self.events.append((name, time.perf_counter() - self.origin))
+        return True
+
+    def report(self):
+        print("Startup timeline:")
+        with self.lock:
+            for name, elapsed in self.events:
+                print("  %8.1f ms  %s" % (elapsed * 1000.0, name))
+
+# -------------------------------
+# Per-frame time breakdown. Draw code wraps its work in begin(name) / end();
+# time spent in a stage over several begin/end pairs in one frame adds up.
+# frame_begin() / frame_end() bracket one rendered frame, and stats() gives
+# the average ms per frame for each stage plus "other" and "frame". Times
+# are CPU time spent issuing the work; the GPU may still be busy after.
+# -------------------------------
+class FrameStages:
+    def __init__(self):
+        self.totals = {}
+        self.frames = 0
+        self.frame_time = 0.0
+        self.frame_start = None
+        self.stage = None
+        self.stage_start = 0.0
+
+    def frame_begin(self):
+        self.frame_start = time.perf_counter()
+
+    def begin(self, name):
+        now = time.perf_counter()
+        self._close(now)
+        self.stage = name
+        self.stage_start = now
+
+    def end(self):
+        self._close(time.perf_counter())
+
+    def _close(self, now):
+        if self.stage is not None:
+            self.totals[self.stage] = self.totals.get(self.stage, 0.0) + now - self.stage_start
+            self.stage = None
+
+    def frame_end(self):
+        now = time.perf_counter()
+        self._close(now)
+        if self.frame_start is not None:
+            self.frame_time += now - self.frame_start
+            self.frames += 1
+            self.frame_start = None
+
+    def stats(self):
+        frames = max(self.frames, 1)
+        stats = {name: round(total * 1000.0 / frames, 3) for name, total in self.totals.items()}
+        stats["other"] = round((self.frame_time - sum(self.totals.values())) * 1000.0 / frames, 3)
+        stats["frame"] = round(self.frame_time * 1000.0 / frames, 3)
+        return stats
+
+# -------------------------------
+# Opens a frame source (dome_sources spec) on a background thread so the
+# window can come up while a camera takes seconds to open. wait() returns
+# the opened source, or None if it failed or took longer than timeout; a
+# source that finishes opening after the timeout is released. Also answers
+# isOpened()/release() so scripts can treat it like the capture it wraps.
+# -------------------------------
+class SourceOpener:
+    def __init__(self, spec, name="capture", timeout=10.0, timeline=None):
+        self.spec = spec
+        self.name = name
+        self.timeout = timeout
+        self.timeline = timeline
+        self.source = None
+        self.state = "opening"
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._open, name=name + "-open", daemon=True)
+        self.thread.start()
+
+    def _open(self):
+        source = open_source(self.spec)
+        with self.lock:
+            if self.state != "opening":
+                # Gave up on it already.
+                source.release()
+                return
+            if source.isOpened():
+                self.source = source
+                self.state = "ready"
+            else:
+                source.release()
+                self.state = "failed"
+        if self.state == "ready":
+            if self.timeline is not None:
+                self.timeline.mark(self.name + " opened")
+        else:
+            print("Error: Could not open %s (%s)" % (self.name, self.spec))
+        self.done.set()
+
+    def wait(self):
+        if not self.done.wait(self.timeout):
+            with self.lock:
+                if self.state == "opening":
+                    self.state = "timeout"
+                    print("Error: Opening %s (%s) timed out after %.1f s"
+                          % (self.name, self.spec, self.timeout))
+        return self.source
+
+    def isOpened(self):
+        return self.state == "ready"
+
+    def release(self):
+        with self.lock:
+            source = self.source
+            self.source = None
+            if self.state == "opening":
+                self.state = "released"
+        if source is not None:
+            source.release()
+
+# -------------------------------
+# On-screen diameter in pixels of a disc of the given radius seen from
+# distance with a vertical field of view of fov_y degrees, or None when the
+# camera is at or inside the disc's radius (the feed may fill the screen).
+# -------------------------------
+def feed_footprint(radius, distance, fov_y, viewport_height):
+    if distance <= radius:
+        return None
+    return viewport_height * radius / (distance * math.tan(math.radians(fov_y) / 2.0))
+
+# -------------------------------
+# Power-of-two (size, size) nearest to a footprint in pixels that a
+# width x height frame should be downscaled to, or None when the frame is
+# not bigger than that.
+# The feed is stretched over the whole disc, so both axes get the same size.
+# -------------------------------
+def footprint_size(footprint, width, height, minimum=64):
+    size = max(minimum, 1 << max(0, int(round(math.log2(max(footprint, 1.0))))))
+    if size >= width or size >= height:
+        return None
+    return (size, size)
+
+# -------------------------------
+# Background reader for one cv2.VideoCapture.
+# A dedicated thread keeps calling cap.read() and publishes only the newest
+# frame into a lock-protected slot, so latest() never waits on the device.
+# Frames that are overwritten before the renderer took them count as dropped.
+# Set footprint to the feed's on-screen size in pixels (see feed_footprint)
+# and frames are downscaled on the capture thread to match; None keeps the
+# full capture resolution.
+# With a recorder (dome_sources.FrameRecorder) every captured frame is also
+# queued for recording at full resolution; stop() closes the recorder.
+# cap may be a SourceOpener: the thread then waits for it to open first, and
+# latest() keeps returning None meanwhile (or for good if it fails).
+# -------------------------------
+class LatestFrameReader:
+    def __init__(self, cap, name="capture", recorder=None, timeline=None):
+        self.cap = cap
+        self.name = name
+        self.recorder = recorder
+        self.timeline = timeline
+        self.lock = threading.Lock()
+        self.slot = None
+        self.thread = None
+        self.running = False
+        self.footprint = None
+
+        # Counters (read them through stats()).
+        self.frames_captured = 0
+        self.frames_downscaled = 0
+        self.frames_dropped = 0
+        self.read_failures = 0
+        self.taken_seq = 0
+        self.taken = None
+        self.presented_seq = 0
+        self.frames_presented = 0
+        self.latency_total = 0.0
+        self.latency_last = 0.0
+        self.latency_max = 0.0
+
+    def start(self):
+        if self.thread is not None:
+            return self
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        cap = self.cap
+        if isinstance(cap, SourceOpener):
+            cap = cap.wait()
+            if cap is None:
+                return
+        seq = 0
+        while self.running:
+            ret, image = cap.read()
+            if not ret:
+                # Device hiccup or end of stream: back off briefly instead of spinning.
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+            now = time.perf_counter()
+            source_time = getattr(cap, "timestamp", None)
+            if self.recorder is not None:
+                self.recorder.record(image, now if source_time is None else source_time)
+            footprint = self.footprint
+            # Packed YUYV (2 channels) cannot be resized without unpacking it,
+            # so those frames stay at capture size.
+            if footprint is not None and image.shape[2] == 3:
+                size = footprint_size(footprint, image.shape[1], image.shape[0])
+                if size is not None:
+                    image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+                    self.frames_downscaled += 1
+            seq += 1
+            with self.lock:
+                if self.slot is not None and self.slot.seq > self.taken_seq:
+                    self.frames_dropped += 1
+                self.slot = CapturedFrame(seq, now, image, source_time)
+                self.frames_captured = seq
+            if seq == 1 and self.timeline is not None:
+                self.timeline.mark(self.name + " first frame")
+
+    # -------------------------------
+    # Return the newest CapturedFrame (or None before the first frame).
+    # Never blocks on the device; the lock is only held for a pointer swap.
+    # -------------------------------
+    def latest(self):
+        with self.lock:
+            frame = self.slot
+            if frame is not None and frame.seq > self.taken_seq:
+                self.taken_seq = frame.seq
+                self.taken = frame
+        return frame
+
+    # -------------------------------
+    # Call right after pygame.display.flip() to record capture-to-display
+    # latency for the newest frame the renderer took.
+    # -------------------------------
+    def frame_presented(self):
+        frame = self.taken
+        if frame is None or frame.seq <= self.presented_seq:
+            return
+        latency = time.perf_counter() - frame.timestamp
+        self.presented_seq = frame.seq
+        self.frames_presented += 1
+        self.latency_last = latency
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def stats(self):
+        presented = self.frames_presented
+        return {
+            "captured": self.frames_captured,
+            "dropped": self.frames_dropped,
+            "downscaled": self.frames_downscaled,
+            "read_failures": self.read_failures,
+            "presented": presented,
+            "latency_last_ms": self.latency_last * 1000.0,
+            "latency_avg_ms": (self.latency_total / presented * 1000.0) if presented else 0.0,
+            "latency_max_ms": self.latency_max * 1000.0,
+        }
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+        if self.recorder is not None:
+            self.recorder.close()
+            print("Recorded %(recorded)d frames to %(path)s (dropped %(dropped_busy)d busy, "
+                  "%(dropped_full)d full)" % self.recorder.stats())
+            self.recorder = None
+
+# -------------------------------
+# Body of one decode worker process.
+# Decodes its share of the videos straight into the shared-memory rings and
+# loops each video at EOF. A video never gets more than depth - 1 frames
+# ahead of the renderer, so the slot the renderer is holding is never reused.
+# -------------------------------
+def decode_worker(jobs, paths, rings, shapes, depth, counters, lock, stop):
+    caps = {}
+    slots = {}
+    for idx in jobs:
+        caps[idx] = open_source(paths[idx], realtime=False)
+        height, width = shapes[idx]
+        slots[idx] = np.ndarray((depth, height, width, 3), dtype=np.uint8,
+                                buffer=rings[idx].buf)
+    try:
+        while not stop.is_set():
+            busy = False
+            for idx in jobs:
+                with lock:
+                    written = counters[2 * idx]
+                    consumed = counters[2 * idx + 1]
+                if written - consumed >= depth - 1:
+                    continue
+                slot = slots[idx][written % depth]
+                # Decode directly into the ring slot when the source allows it;
+                # the source restarts itself at the end of the video.
+                ret, frame = caps[idx].read(slot)
+                if not ret:
+                    continue
+                if frame.shape != slot.shape:
+                    frame = cv2.resize(frame, (slot.shape[1], slot.shape[0]),
+                                       interpolation=cv2.INTER_AREA)
+                if not np.shares_memory(frame, slot):
+                    slot[...] = frame
+                with lock:
+                    counters[2 * idx] = written + 1
+                busy = True
+            if not busy:
+                stop.wait(0.002)
+    finally:
+        for cap in caps.values():
+            cap.release()
+        slots.clear()
+        for idx in jobs:
+            rings[idx].close()
+
+# -------------------------------
+# A clip decoded once and looped from memory.
+# frames is one contiguous (count, height, width, 3) uint8 array, either in
+# RAM or an np.memmap on disk. The frames are shared by every consumer of
+# the clip; each one plays it through its own cursor(), so two videos with
+# the same path do not advance each other. Reading never seeks, the loop
+# point is just an index wrap. The clip is usable once fill() has decoded
+# it.
+# -------------------------------
+class CachedClip:
+    def __init__(self, cache, path, frames, filename=None):
+        self.cache = cache
+        self.path = path
+        self.frames = frames
+        self.filename = filename
+        self.count = 0
+        self.loaded = False
+
+    # -------------------------------
+    # Decode the whole clip into frames. Returns the number of frames decoded,
+    # 0 if the stop event was set before the clip was complete.
+    # -------------------------------
+    def fill(self, stop=None):
+        cap = open_source(self.path, realtime=False, loop=False)
+        shape = self.frames.shape[1:]
+        decoded = 0
+        while decoded < len(self.frames):
+            if stop is not None and stop.is_set():
+                decoded = 0
+                break
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame.shape != shape:
+                frame = cv2.resize(frame, (shape[1], shape[0]), interpolation=cv2.INTER_AREA)
+            self.frames[decoded] = frame
+            decoded += 1
+        cap.release()
+        # The container's frame count can be an overestimate.
+        self.cache.bytes_used -= (len(self.frames) - decoded) * self.frames[0].nbytes
+        self.frames = self.frames[:decoded]
+        self.count = decoded
+        self.loaded = decoded > 0
+        return decoded
+
+    def cursor(self):
+        return ClipCursor(self)
+
+    def release(self):
+        # The mapping goes away with the last view; the file can be unlinked now.
+        self.loaded = False
+        self.frames = None
+        if self.filename is not None:
+            os.remove(self.filename)
+            self.filename = None
+
+# -------------------------------
+# One consumer's playback position in a CachedClip.
+# -------------------------------
+class ClipCursor:
+    def __init__(self, clip):
+        self.clip = clip
+        self.seq = 0
+
+    # -------------------------------
+    # Next frame as (view, seq), same contract as VideoDecodePool.read(),
+    # or None while the clip is still loading.
+    # -------------------------------
+    def read(self):
+        clip = self.clip
+        if not clip.loaded:
+            return None
+        frame = clip.frames[self.seq % clip.count]
+        self.seq += 1
+        clip.cache.hits += 1
+        return frame, self.seq
+
+# -------------------------------
+# Memory-budgeted cache of short looping clips.
+# load(path) decodes a clip once (downscaled to fit size=(width, height) if
+# it is bigger) into RAM, or into a memmap under memmap_dir when storage is
+# "memmap", and returns the CachedClip (the same one for every load of a
+# path; read it through cursor()). Clips that would exceed budget_mb are
+# not cached and load() returns None; the caller streams those instead
+# (VideoDecodePool does this through its read-ahead rings, which also cover
+# the loop point). admit(path) makes the same decision and reserves the
+# memory without decoding, so the caller can fill() the clip later; fits()
+# answers it from a probe without reserving anything. admit() and load()
+# take the probe (width, height, frame count) instead of opening the file
+# again. load() stops decoding when its stop event is set and drops the
+# unfinished clip.
+# -------------------------------
+class ClipCache:
+    def __init__(self, budget_mb=512, size=None, storage="memory", memmap_dir=None):
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.size = size
+        self.storage = storage
+        self.memmap_dir = memmap_dir or tempfile.gettempdir()
+        self.clips = {}
+        self.streamed = []
+        self.bytes_used = 0
+
+        # Counters (read them through stats()).
+        self.hits = 0    # Frames served from a cached clip
+        self.misses = 0  # Frames the caller had to decode (streamed clips)
+
+    def frame_shape(self, width, height):
+        if self.size is not None and (width > self.size[0] or height > self.size[1]):
+            width, height = self.size
+        return height, width, 3
+
+    def _allocate(self, count, shape):
+        if self.storage != "memmap":
+            return np.empty((count,) + shape, dtype=np.uint8), None
+        fd, filename = tempfile.mkstemp(prefix="clip-", suffix=".raw", dir=self.memmap_dir)
+        os.close(fd)
+        frames = np.memmap(filename, dtype=np.uint8, mode="w+", shape=(count,) + shape)
+        return frames, filename
+
+    # -------------------------------
+    # Bytes a clip of count width x height frames takes in the cache, or
+    # None if its length is unknown or it does not fit the budget left
+    # after another `reserved` bytes.
+    # -------------------------------
+    def fits(self, width, height, count, reserved=0):
+        shape = self.frame_shape(width, height)
+        clip_bytes = count * shape[0] * shape[1] * 3
+        if count <= 0 or clip_bytes > self.budget - self.bytes_used - reserved:
+            return None
+        return clip_bytes
+
+    def admit(self, path, probe=None):
+        if path in self.clips:
+            return self.clips[path]
+        if probe is None:
+            cap = open_source(path, realtime=False, loop=False)
+            if not cap.isOpened():
+                return None
+            probe = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                     int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+            cap.release()
+        width, height, count = probe
+        clip_bytes = self.fits(width, height, count)
+        if clip_bytes is None:
+            # Unknown length or over budget: leave it to the streaming path.
+            self.stream(path)
+            return None
+        frames, filename = self._allocate(count, self.frame_shape(width, height))
+        clip = CachedClip(self, path, frames, filename)
+        self.clips[path] = clip
+        self.bytes_used += clip_bytes
+        return clip
+
+    def load(self, path, probe=None, stop=None):
+        clip = self.admit(path, probe)
+        if clip is None or clip.loaded:
+            return clip
+        if clip.fill(stop) == 0:
+            clip.release()
+            del self.clips[path]
+            if stop is None or not stop.is_set():
+                self.stream(path)
+            return None
+        return clip
+
+    # Record a video the caller streams instead of caching (stats()["streamed"]).
+    def stream(self, path):
+        if path not in self.streamed:
+            self.streamed.append(path)
+
+    def stats(self):
+        reads = self.hits + self.misses
+        return {
+            "cached": len(self.clips),
+            "loaded": sum(1 for clip in self.clips.values() if clip.loaded),
+            "streamed": len(self.streamed),
+            "storage": self.storage,
+            "bytes_used": self.bytes_used,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / reads) if reads else 0.0,
+        }
+
+    def close(self):
+        for clip in self.clips.values():
+            clip.release()
+        self.clips = {}
+        self.bytes_used = 0
+
+# -------------------------------
+# Decode several video files (or any dome_sources spec) in worker processes.
+# Every video gets a shared-memory ring of ring_depth frames; read(index)
+# hands out a NumPy view into the ring (no copy) together with a sequence
+# number, and returns the previous view again if the worker is behind.
+# With a ClipCache, clips that fit its budget are admitted to the cache and
+# decoded once on a loader thread, then looped from memory; only the others
+# get a worker and a ring. The constructor only reads each video's header
+# (to size the rings before the workers fork), and read() returns None for
+# a clip until the loader has finished it.
+# Workers are forked while the caller is still single-threaded, so create the
+# pool before starting capture threads or the GL context. The scripts create
+# the pool at import, which a spawned worker would repeat, so without fork
+# the streamed videos are read in this process by LatestFrameReader threads
+# instead. Call close() to stop the workers (or readers), release every
+# capture and free the shared memory.
+# -------------------------------
+class VideoDecodePool:
+    def __init__(self, paths, ring_depth=4, workers=None, clip_cache=None, timeline=None):
+        self.paths = list(paths)
+        self.timeline = timeline
+        self.depth = max(2, ring_depth)
+        self.count = len(self.paths)
+        self.clip_cache = clip_cache
+        self.cached = [False] * self.count
+        self.probes = [None] * self.count
+        self.cursors = [None] * self.count
+        self.failed = []
+        self.shapes = []
+        reserved = {}
+        for idx, path in enumerate(self.paths):
+            cap = open_source(path, realtime=False)
+            if not cap.isOpened():
+                self.failed.append(path)
+                self.shapes.append((1, 1))
+                cap.release()
+                continue
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
+            if clip_cache is not None:
+                # Short clips loop from memory; the rest stream through a worker,
+                # downscaled the same way. The loader thread admits the clips
+                # in this order, so it reserves the same memory.
+                clip_bytes = reserved.get(path) or clip_cache.fits(width, height, count,
+                                                                   sum(reserved.values()))
+                if clip_bytes is not None:
+                    reserved[path] = clip_bytes
+                    self.cached[idx] = True
+                    self.probes[idx] = (width, height, count)
+                else:
+                    clip_cache.stream(path)
+                height, width = clip_cache.frame_shape(width, height)[:2]
+            self.shapes.append((height, width))
+
+        self.in_process = "fork" not in multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context(None if self.in_process else "fork")
+        self.readers = [None] * self.count
+        self.rings = []
+        self.slots = []
+        for idx, (height, width) in enumerate(self.shapes):
+            if self.cached[idx] or self.in_process:
+                self.rings.append(None)
+                self.slots.append(None)
+                continue
+            ring = shared_memory.SharedMemory(create=True, size=self.depth * height * width * 3)
+            self.rings.append(ring)
+            self.slots.append(np.ndarray((self.depth, height, width, 3), dtype=np.uint8,
+                                         buffer=ring.buf))
+        # Per video: frames written by the worker, frames taken by the renderer.
+        self.counters = ctx.RawArray("q", 2 * self.count)
+        self.lock = ctx.Lock()
+        self.stop = ctx.Event()
+        self.last = [None] * self.count
+        self.underruns = 0
+
+        self.workers = []
+        if self.in_process:
+            for idx in self.streamed():
+                cap = open_source(self.paths[idx])
+                self.readers[idx] = LatestFrameReader(cap, name="video-%d" % idx).start()
+            workers = 0
+        else:
+            workers = workers or os.cpu_count() or 1
+            workers = max(1, min(workers, len(self.streamed())))
+        for w in range(workers):
+            jobs = [idx for idx in self.streamed() if idx % workers == w]
+            if not jobs:
+                continue
+            proc = ctx.Process(target=decode_worker, name="decode-%d" % w, daemon=True,
+                               args=(jobs, self.paths, self.rings, self.shapes, self.depth,
+                                     self.counters, self.lock, self.stop))
+            proc.start()
+            self.workers.append(proc)
+
+        # Cached clips are admitted and decoded on a thread once the workers
+        # are forked, so creating the pool does not wait for them.
+        self.loader = None
+        if any(self.cached):
+            self.loader = threading.Thread(target=self._load_clips, name="clip-loader",
+                                           daemon=True)
+            self.loader.start()
+
+    def _load_clips(self):
+        for idx, path in enumerate(self.paths):
+            if not self.cached[idx] or self.stop.is_set():
+                continue
+            clip = self.clip_cache.load(path, self.probes[idx], self.stop)
+            if self.stop.is_set():
+                return
+            if clip is None:
+                print("Error: Could not decode video %s" % path)
+                continue
+            # Videos with the same path share the frames, not the position.
+            self.cursors[idx] = clip.cursor()
+        if self.timeline is not None:
+            self.timeline.mark("videos cached")
+
+    # Indices of the videos decoded by the workers.
+    def streamed(self):
+        return [idx for idx in range(self.count)
+                if not self.cached[idx] and self.paths[idx] not in self.failed]
+
+    # -------------------------------
+    # Newest unread frame of video index as (view, seq), or the previous one.
+    # The view stays valid until the next read() of the same video.
+    # -------------------------------
+    def read(self, index):
+        if self.cached[index]:
+            cursor = self.cursors[index]
+            return cursor.read() if cursor is not None else None
+        if self.clip_cache is not None:
+            self.clip_cache.misses += 1
+        reader = self.readers[index]
+        if reader is not None:
+            captured = reader.latest()
+            if captured is not None:
+                self.last[index] = (captured.image, captured.seq)
+            else:
+                self.underruns += 1
+            return self.last[index]
+        with self.lock:
+            written = self.counters[2 * index]
+            consumed = self.counters[2 * index + 1]
+            if written > consumed:
+                self.counters[2 * index + 1] = consumed + 1
+        if written > consumed:
+            self.last[index] = (self.slots[index][consumed % self.depth], consumed + 1)
+        else:
+            self.underruns += 1
+        return self.last[index]
+
+    def stats(self):
+        with self.lock:
+            counters = list(self.counters)
+        return {
+            "workers": len(self.workers),
+            "in_process": self.in_process,
+            "cached": list(self.cached),
+            "loaded": [cursor is not None and cursor.clip.loaded for cursor in self.cursors],
+            "ring_depth": self.depth,
+            "decoded": counters[0::2],
+            "consumed": counters[1::2],
+            "underruns": self.underruns,
+        }
+
+    def close(self):
+        self.stop.set()
+        if self.loader is not None:
+            self.loader.join(timeout=2.0)
+            self.loader = None
+        for proc in self.workers:
+            proc.join(timeout=2.0)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+        self.workers = []
+        for reader in self.readers:
+            if reader is not None:
+                reader.stop()
+                reader.cap.release()
+        self.readers = [None] * self.count
+        self.slots = []
+        self.last = [None] * self.count
+        for ring in self.rings:
+            if ring is not None:
+                ring.close()
+                ring.unlink()
+        self.rings = []
+        self.cursors = [None] * self.count
@@ -0,0 +1,566 @@
+import ctypes
+import math
+import os
+from collections import OrderedDict
+
+import numpy as np
+from OpenGL.GL import *
+
+from dome_capture import feed_footprint
+
+# DOME_BACKFACE_CULL=1 also skips dome patches that face away from the
+# camera. Off by default: the dome is transparent, so its far side shows.
+DEFAULT_BACKFACE_CULLING = os.environ.get("DOME_BACKFACE_CULL", "0") == "1"
+
+# -------------------------------
+# Dome geometry for the webcam dome scripts.
+# Meshes are built with NumPy once per parameter key and kept in vertex
+# buffer objects, so drawing the dome is a single glDrawElements call
+# instead of one glBegin/glEnd pair per patch.
+# -------------------------------
+
+# -------------------------------
+# Square patches of a grid x grid lattice over the dome's base square,
+# lifted onto the hemisphere. A patch is kept only if all four corners lie
+# inside the base circle (the old per-quad corner test). Returns
+# (vertices, indices): float32 (n, 3) positions and uint32 quad indices,
+# four per patch, with only the vertices the patches use.
+# -------------------------------
+def build_square_patches(radius, grid):
+    dx = (2 * radius) / grid
+    coords = -radius + np.arange(grid + 1) * dx
+    x, z = np.meshgrid(coords, coords, indexing="ij")
+    inside = x * x + z * z <= radius * radius
+    y = np.sqrt(np.maximum(radius * radius - x * x - z * z, 0.0))
+    patches = inside[:-1, :-1] & inside[1:, :-1] & inside[1:, 1:] & inside[:-1, 1:]
+    i, j = np.nonzero(patches)
+    n = grid + 1
+    corner = i * n + j
+    # Same winding as before: (x0, z0), (x1, z0), (x1, z1), (x0, z1).
+    indices = np.stack([corner, corner + n, corner + n + 1, corner + 1], axis=1).ravel()
+    used, indices = np.unique(indices, return_inverse=True)
+    vertices = np.stack([x, y, z], axis=-1).reshape(-1, 3)[used]
+    return vertices.astype(np.float32), indices.astype(np.uint32)
+
+# -------------------------------
+# Latitude/longitude hemisphere with shared vertices: one apex vertex plus
+# stacks rings of slices vertices, the last ring on the base circle, so the
+# rim is closed. quality q gives 2**(q+1) stacks and four times as many
+# slices (q=4: 8064 triangles, 4097 vertices). Returns (vertices, indices)
+# for GL_TRIANGLES, wound counter-clockwise seen from outside.
+# -------------------------------
+def build_latlong_dome(radius, quality):
+    stacks = 2 ** (quality + 1)
+    slices = 4 * stacks
+    theta = np.arange(1, stacks + 1) * (np.pi / 2 / stacks)
+    phi = np.arange(slices) * (2 * np.pi / slices)
+    ring_x = np.outer(np.sin(theta), np.cos(phi))
+    ring_z = np.outer(np.sin(theta), np.sin(phi))
+    ring_y = np.repeat(np.cos(theta)[:, None], slices, axis=1)
+    rings = np.stack([ring_x, ring_y, ring_z], axis=-1).reshape(-1, 3)
+    vertices = radius * np.vstack([[0.0, 1.0, 0.0], rings])
+    # Vertex of ring k (0 = just below the apex), slice j.
+    j = np.arange(slices)
+    j1 = (j + 1) % slices
+    cap = np.stack([np.zeros(slices, dtype=np.int64), 1 + j1, 1 + j], axis=1)
+    k = np.arange(stacks - 1)[:, None]
+    a = 1 + k * slices + j
+    b = 1 + k * slices + j1
+    c = a + slices
+    d = b + slices
+    band = np.stack([a, d, c, a, b, d], axis=-1).reshape(-1, 3)
+    indices = np.vstack([cap, band]).ravel()
+    return vertices.astype(np.float32), indices.astype(np.uint32)
+
+# -------------------------------
+# Geodesic hemisphere: an icosahedron with poles on the y axis, subdivided
+# quality + 1 times (every triangle into four, midpoints shared and pushed
+# out to the sphere). Triangles whose centre lies above the base plane are
+# kept and the vertices below it are moved onto the base circle, so the
+# rim is closed. quality q gives roughly 10 * 4**(q+1) triangles. Returns
+# (vertices, indices) for GL_TRIANGLES, wound like build_latlong_dome.
+# -------------------------------
+def build_icosphere_dome(radius, quality):
+    ring = np.arctan(0.5)
+    upper = np.arange(5) * (2 * np.pi / 5)
+    lower = upper + np.pi / 5
+    vertices = np.vstack([
+        [[0.0, 1.0, 0.0]],
+        np.stack([np.cos(ring) * np.cos(upper), np.full(5, np.sin(ring)),
+                  np.cos(ring) * np.sin(upper)], axis=1),
+        np.stack([np.cos(ring) * np.cos(lower), np.full(5, -np.sin(ring)),
+                  np.cos(ring) * np.sin(lower)], axis=1),
+        [[0.0, -1.0, 0.0]],
+    ])
+    i = np.arange(5)
+    i1 = (i + 1) % 5
+    triangles = np.vstack([
+        np.stack([np.zeros(5, dtype=np.int64), 1 + i1, 1 + i], axis=1),
+        np.stack([1 + i, 1 + i1, 6 + i], axis=1),
+        np.stack([1 + i1, 6 + i1, 6 + i], axis=1),
+        np.stack([np.full(5, 11), 6 + i, 6 + i1], axis=1),
+    ])
+    for _ in range(quality + 1):
+        a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        edges = np.sort(np.stack([np.stack([a, b], 1), np.stack([b, c], 1),
+                                  np.stack([c, a], 1)]).reshape(-1, 2), axis=1)
+        edges, edge_index = np.unique(edges, axis=0, return_inverse=True)
+        edge_index = edge_index.reshape(3, -1)
+        midpoints = vertices[edges[:, 0]] + vertices[edges[:, 1]]
+        midpoints /= np.linalg.norm(midpoints, axis=1, keepdims=True)
+        ab, bc, ca = edge_index + len(vertices)
+        vertices = np.vstack([vertices, midpoints])
+        triangles = np.vstack([np.stack([a, ab, ca], 1), np.stack([b, bc, ab], 1),
+                               np.stack([c, ca, bc], 1), np.stack([ab, bc, ca], 1)])
+    triangles = triangles[vertices[triangles].mean(axis=1)[:, 1] > 0]
+    used, indices = np.unique(triangles.ravel(), return_inverse=True)
+    vertices = vertices[used]
+    below = vertices[:, 1] < 0
+    vertices[below, 1] = 0
+    vertices[below] /= np.linalg.norm(vertices[below], axis=1, keepdims=True)
+    return (radius * vertices).astype(np.float32), indices.astype(np.uint32)
+
+# -------------------------------
+# One mesh in GPU buffers. The buffers are created on the first draw, so a
+# mesh can be built before the GL context exists.
+#
+# Primitives are sorted into sectors x bands patch clusters by the azimuth
+# and elevation of their centres, and each cluster is a contiguous index
+# range with a bounding sphere and a cone around its (radial) normals, so
+# callers can cull clusters and draw(clusters) can draw the rest. For
+# the lat/long mesh at quality >= 1 the cluster borders fall on grid lines,
+# so cluster k covers the same part of the dome at every level.
+# -------------------------------
+class DomeMesh:
+    def __init__(self, vertices, indices, mode=GL_QUADS, sectors=16, bands=4):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        self.indices = np.ascontiguousarray(indices, dtype=np.uint32)
+        self.mode = mode
+        self.count = len(self.indices)
+        self.corners = 4 if mode == GL_QUADS else 3
+        self.triangles = (self.count // self.corners) * (self.corners - 2)
+        self.radius = float(np.linalg.norm(self.vertices, axis=1).max()) if len(self.vertices) else 0.0
+        self.vertex_buffer = None
+        self.index_buffer = None
+        self._sort_clusters(sectors, bands)
+
+    def _sort_clusters(self, sectors, bands):
+        primitives = self.indices.reshape(-1, self.corners)
+        centres = self.vertices[primitives].mean(axis=1)
+        azimuth = np.arctan2(centres[:, 2], centres[:, 0]) % (2 * np.pi)
+        elevation = np.arctan2(centres[:, 1], np.hypot(centres[:, 0], centres[:, 2]))
+        sector = np.minimum((azimuth * (sectors / (2 * np.pi))).astype(np.int64), sectors - 1)
+        band = np.clip((elevation * (bands / (np.pi / 2))).astype(np.int64), 0, bands - 1)
+        cluster = band * sectors + sector
+        order = np.argsort(cluster, kind="stable")
+        primitives = primitives[order]
+        cluster = cluster[order]
+        self.indices = np.ascontiguousarray(primitives.ravel())
+        counts = np.bincount(cluster, minlength=sectors * bands)
+        first = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        self.cluster_first = first * self.corners
+        self.cluster_count = counts * self.corners
+        self.cluster_centre = np.zeros((len(counts), 3), dtype=np.float32)
+        self.cluster_radius = np.zeros(len(counts), dtype=np.float32)
+        self.cluster_axis = np.zeros((len(counts), 3), dtype=np.float32)
+        self.cluster_cone = np.full(len(counts), np.pi, dtype=np.float32)
+        for k in np.flatnonzero(counts):
+            points = self.vertices[primitives[first[k]:first[k] + counts[k]].ravel()]
+            centre = (points.min(axis=0) + points.max(axis=0)) / 2
+            self.cluster_centre[k] = centre
+            self.cluster_radius[k] = np.linalg.norm(points - centre, axis=1).max()
+            # On a sphere the face normals lie within the cone of the
+            # vertex directions.
+            normals = points / np.maximum(np.linalg.norm(points, axis=1, keepdims=True), 1e-9)
+            axis = normals.mean(axis=0)
+            length = np.linalg.norm(axis)
+            if length > 1e-6:
+                axis /= length
+                self.cluster_axis[k] = axis
+                self.cluster_cone[k] = np.arccos(np.clip(normals @ axis, -1.0, 1.0)).max()
+
+    # -------------------------------
+    # Clusters whose every face points away from eye. A cluster is
+    # back-facing when eye lies inside the cone opposite its normal cone,
+    # narrowed by the angle its bounding sphere covers. The normals point
+    # outwards for an eye outside the sphere and inwards for one inside it,
+    # where the camera looks at the inner side of every face.
+    # -------------------------------
+    def back_facing(self, eye):
+        offset = eye - self.cluster_centre
+        distance = np.linalg.norm(offset, axis=1)
+        spread = np.arcsin(np.clip(self.cluster_radius / np.maximum(distance, 1e-9), 0.0, 1.0))
+        facing = 1.0 if np.linalg.norm(eye) < self.radius else -1.0
+        cos_angle = facing * np.einsum("ij,ij->i", self.cluster_axis, offset) / np.maximum(distance, 1e-9)
+        angle = np.arccos(np.clip(cos_angle, -1.0, 1.0))
+        return (distance > self.cluster_radius) & (angle < np.pi / 2 - self.cluster_cone - spread)
+
+    def _upload(self):
+        self.vertex_buffer, self.index_buffer = glGenBuffers(2)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        glBufferData(GL_ARRAY_BUFFER, self.vertices.nbytes, self.vertices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
+
+    # -------------------------------
+    # Draw the whole mesh, or only the given cluster numbers (one
+    # glDrawElements per cluster). Returns the number of triangles drawn.
+    # -------------------------------
+    def draw(self, clusters=None):
+        if self.count == 0:
+            return 0
+        if self.vertex_buffer is None:
+            self._upload()
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, None)
+        if clusters is None:
+            glDrawElements(self.mode, self.count, GL_UNSIGNED_INT, None)
+            drawn = self.count
+        else:
+            # Neighbouring clusters are adjacent in the index buffer, so
+            # runs of them go out as one call.
+            drawn = 0
+            for first, count in self._runs(clusters):
+                glDrawElements(self.mode, count, GL_UNSIGNED_INT, ctypes.c_void_p(first * 4))
+                drawn += count
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        return (drawn // self.corners) * (self.corners - 2)
+
+    def _runs(self, clusters):
+        runs = []
+        for k in clusters:
+            first, count = int(self.cluster_first[k]), int(self.cluster_count[k])
+            if not count:
+                continue
+            if runs and runs[-1][0] + runs[-1][1] == first:
+                runs[-1][1] += count
+            else:
+                runs.append([first, count])
+        return runs
+
+    def release(self):
+        if self.vertex_buffer is not None:
+            glDeleteBuffers(2, [self.vertex_buffer, self.index_buffer])
+            self.vertex_buffer = self.index_buffer = None
+
+# -------------------------------
+# Small LRU of built meshes keyed by the build parameters, e.g.
+# (dome_radius, grid). Dragging a slider back and forth reuses recent
+# meshes; the least recently drawn one is released once more than size
+# are held.
+# -------------------------------
+class DomeMeshCache:
+    def __init__(self, build=build_square_patches, size=8, mode=GL_QUADS):
+        self.build = build
+        self.size = size
+        self.mode = mode
+        self.meshes = OrderedDict()
+
+        # Counters for the frame statistics.
+        self.builds = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def get(self, *key):
+        mesh = self.meshes.get(key)
+        if mesh is not None:
+            self.meshes.move_to_end(key)
+            self.hits += 1
+            return mesh
+        vertices, indices = self.build(*key)
+        mesh = DomeMesh(vertices, indices, self.mode)
+        self.meshes[key] = mesh
+        self.builds += 1
+        while len(self.meshes) > self.size:
+            _, old = self.meshes.popitem(last=False)
+            old.release()
+            self.evictions += 1
+        return mesh
+
+    def draw(self, *key):
+        return self.get(*key).draw()
+
+    def stats(self):
+        return {
+            "meshes": len(self.meshes),
+            "builds": self.builds,
+            "hits": self.hits,
+            "evictions": self.evictions,
+        }
+
+    def release(self):
+        for mesh in self.meshes.values():
+            mesh.release()
+        self.meshes.clear()
+
+# -------------------------------
+# Static scenery around the dome: the textured base circle (a triangle fan
+# with texture coordinates), the yellow spokes on the base and the apex
+# marker. Their arrays are built with NumPy when the radius changes and each
+# part is drawn with one glDrawArrays call. With stages (a FrameStages) the
+# draws are timed as the "static scenery" stage.
+# -------------------------------
+class DomeScenery:
+    def __init__(self, spoke_step=15, stages=None):
+        self.spoke_step = spoke_step
+        self.stages = stages
+        self.base_key = None
+        self.radius = None
+
+    def _base(self, radius, slices):
+        if self.base_key != (radius, slices):
+            angle = 2 * np.pi * np.arange(slices + 1) / slices
+            rim = np.stack([radius * np.cos(angle), np.zeros_like(angle),
+                            radius * np.sin(angle)], axis=1)
+            self.base_vertices = np.vstack([[0.0, 0.0, 0.0], rim]).astype(np.float32)
+            texcoords = np.stack([0.5 + 0.5 * np.cos(angle), 0.5 + 0.5 * np.sin(angle)], axis=1)
+            self.base_texcoords = np.vstack([[0.5, 0.5], texcoords]).astype(np.float32)
+            self.base_key = (radius, slices)
+
+    def _radial(self, radius):
+        if self.radius != radius:
+            angle = np.radians(np.arange(0, 360, self.spoke_step))
+            spokes = np.zeros((len(angle), 2, 3), dtype=np.float32)
+            spokes[:, 1, 0] = radius * np.cos(angle)
+            spokes[:, 1, 2] = radius * np.sin(angle)
+            self.spoke_vertices = spokes.reshape(-1, 3)
+            self.apex_vertex = np.array([[0.0, radius, 0.0]], dtype=np.float32)
+            self.radius = radius
+
+    def _begin(self):
+        if self.stages is not None:
+            self.stages.begin("static scenery")
+
+    def _end(self):
+        if self.stages is not None:
+            self.stages.end()
+
+    # -------------------------------
+    # Base circle with the currently bound texture.
+    # -------------------------------
+    def draw_base(self, radius, slices=100):
+        self._begin()
+        self._base(radius, slices)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, self.base_vertices)
+        glTexCoordPointer(2, GL_FLOAT, 0, self.base_texcoords)
+        glDrawArrays(GL_TRIANGLE_FAN, 0, len(self.base_vertices))
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        self._end()
+
+    def draw_spokes(self, radius):
+        self._begin()
+        self._radial(radius)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, self.spoke_vertices)
+        glDrawArrays(GL_LINES, 0, len(self.spoke_vertices))
+        glDisableClientState(GL_VERTEX_ARRAY)
+        self._end()
+
+    def draw_apex(self, radius):
+        self._begin()
+        self._radial(radius)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, self.apex_vertex)
+        glDrawArrays(GL_POINTS, 0, 1)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        self._end()
+
+# Dome tessellations by name: (build function, primitive).
+TESSELLATIONS = {
+    "patches": (build_square_patches, GL_QUADS),
+    "latlong": (build_latlong_dome, GL_TRIANGLES),
+    "icosphere": (build_icosphere_dome, GL_TRIANGLES),
+}
+
+QUALITY_LEVELS = 5
+
+# -------------------------------
+# Mesh cache for a tessellation name ("patches", "latlong", "icosphere").
+# -------------------------------
+def open_dome_mesh(kind, size=8):
+    build, mode = TESSELLATIONS[kind]
+    return DomeMeshCache(build, size, mode)
+
+# -------------------------------
+# Second key value for open_dome_mesh(kind): the patch grid itself, or a
+# quality level for the shared-vertex tessellations, from 0 at grid 5 to
+# QUALITY_LEVELS - 1 at grid 80 (each level doubles the grid).
+# -------------------------------
+def dome_detail(kind, grid):
+    if kind == "patches":
+        return grid
+    return int(min(QUALITY_LEVELS - 1, max(0, round(np.log2(max(grid, 1) / 5.0)))))
+
+# -------------------------------
+# Camera position (x, y, z) in the frame of a dome drawn after
+# glRotatef(degrees(rotation), 0, 1, 0).
+# -------------------------------
+def dome_eye(eye, rotation):
+    x, y, z = eye
+    c, s = math.cos(rotation), math.sin(rotation)
+    return np.array([x * c - z * s, y, x * s + z * c], dtype=np.float32)
+
+# -------------------------------
+# The six frustum planes (a, b, c, d), normals pointing inwards, in the
+# coordinates of the current modelview matrix; a point p is inside when
+# a*x + b*y + c*z + d >= 0 for every plane.
+# -------------------------------
+def frustum_planes():
+    # GL returns column-major matrices, so these are the transposes and
+    # the columns of clip are the rows of projection * modelview.
+    modelview = np.array(glGetFloatv(GL_MODELVIEW_MATRIX), dtype=np.float64).reshape(4, 4)
+    projection = np.array(glGetFloatv(GL_PROJECTION_MATRIX), dtype=np.float64).reshape(4, 4)
+    clip = modelview @ projection
+    planes = np.array([clip[:, 3] + clip[:, 0], clip[:, 3] - clip[:, 0],
+                       clip[:, 3] + clip[:, 1], clip[:, 3] - clip[:, 1],
+                       clip[:, 3] + clip[:, 2], clip[:, 3] - clip[:, 2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+# -------------------------------
+# Camera-distance level of detail for a dome tessellation.
+# set_view() is called once per frame after the camera is placed; draw()
+# then picks the lowest quality level whose silhouette stays within
+# max_error pixels of the true circle on screen, capped by the grid slider
+# (dome_detail). The level only
+# changes when the ideal level moves more than 0.5 + hysteresis away from
+# it, so zooming across a threshold does not flicker.
+#
+# With the camera inside the dome every level is too coarse, so the lat/long
+# mesh also refines the patch clusters within refine_distance * radius of
+# the camera by one level, up to QUALITY_LEVELS - 1. Square patches have no
+# levels and are drawn at the slider's grid.
+#
+# The meshes are built for a unit dome and scaled to the radius when drawn,
+# so every quality level is built once in __init__ and neither a level
+# switch nor the radius slider builds a mesh in the render loop.
+#
+# Patch clusters whose bounding sphere lies outside the view frustum are
+# not submitted, and with cull_backfaces neither are clusters facing away
+# from the camera. stats() reports the counts for the last frame.
+# -------------------------------
+class DomeLOD:
+    def __init__(self, kind, max_error=0.5, hysteresis=0.3, refine_distance=0.5,
+                 cull_backfaces=None):
+        self.kind = kind
+        self.meshes = open_dome_mesh(kind)
+        if kind != "patches":
+            for level in range(QUALITY_LEVELS):
+                self.meshes.get(1.0, level)
+        self.max_error = max_error
+        self.hysteresis = hysteresis
+        self.refine_distance = refine_distance
+        self.refine_inside = kind == "latlong"
+        if cull_backfaces is None:
+            cull_backfaces = DEFAULT_BACKFACE_CULLING
+        self.cull_backfaces = cull_backfaces
+        self.eye = None
+        self.radius = None
+        self.fov_y = 45
+        self.viewport_height = 600
+        self.level = None
+        self.inside = False
+
+        # Counters for the frame statistics.
+        self.switches = 0
+        self.triangles_drawn = {}
+        self.submitted = 0
+        self.culled_frustum = 0
+        self.culled_backface = 0
+
+    def set_view(self, eye, rotation, fov_y, viewport_height):
+        self.eye = dome_eye(eye, rotation)
+        self.fov_y = fov_y
+        self.viewport_height = viewport_height
+
+    def select(self, radius, max_level):
+        distance = float(np.linalg.norm(self.eye)) if self.eye is not None else 0.0
+        footprint = feed_footprint(radius, distance, self.fov_y, self.viewport_height)
+        self.inside = footprint is None
+        if self.inside:
+            level = max_level
+        else:
+            # Rim edges needed for the chord to stay within max_error pixels
+            # of the circle; the level-q mesh has about 8 * 2**q of them.
+            # footprint is the circle's diameter on screen.
+            edges = math.pi / math.acos(max(1.0 - self.max_error / max(footprint / 2, 1e-6), -1.0))
+            ideal = math.log2(edges / 8)
+            ideal = min(max(ideal, 0.0), max_level)
+            level = self.level
+            if level is None or abs(ideal - level) > 0.5 + self.hysteresis:
+                level = int(round(ideal))
+            level = min(level, max_level)
+        if level != self.level:
+            if self.level is not None:
+                self.switches += 1
+            self.level = level
+        return level
+
+    # -------------------------------
+    # Numbers of the clusters of mesh that survive culling. Call with the
+    # unit dome's modelview matrix (scaled by the radius) current.
+    # -------------------------------
+    def visible_clusters(self, mesh):
+        planes = frustum_planes()
+        distances = mesh.cluster_centre @ planes[:, :3].T + planes[:, 3]
+        in_frustum = (distances >= -mesh.cluster_radius[:, None]).all(axis=1)
+        visible = mesh.cluster_count > 0
+        self.culled_frustum = int((visible & ~in_frustum).sum())
+        visible &= in_frustum
+        self.culled_backface = 0
+        if self.cull_backfaces and self.eye is not None:
+            back = mesh.back_facing(self.eye / self.radius)
+            self.culled_backface = int((visible & back).sum())
+            visible &= ~back
+        self.submitted = int(visible.sum())
+        return np.flatnonzero(visible)
+
+    # -------------------------------
+    # Draw the dome. Returns the number of triangles drawn.
+    # -------------------------------
+    def draw(self, radius, grid):
+        self.radius = radius
+        detail = dome_detail(self.kind, grid)
+        if self.kind == "patches":
+            level = self.level = detail
+        else:
+            level = self.select(radius, detail)
+        mesh = self.meshes.get(1.0, level)
+        glPushMatrix()
+        glScalef(radius, radius, radius)
+        visible = self.visible_clusters(mesh)
+        fine_level = min(level + 1, QUALITY_LEVELS - 1)
+        if not (self.inside and self.refine_inside and 1 <= level < fine_level):
+            self.triangles_drawn = {level: mesh.draw(visible)}
+        else:
+            fine = self.meshes.get(1.0, fine_level)
+            gap = (np.linalg.norm(mesh.cluster_centre[visible] - self.eye / radius, axis=1)
+                   - mesh.cluster_radius[visible])
+            near = gap < self.refine_distance
+            self.triangles_drawn = {
+                level: mesh.draw(visible[~near]),
+                fine_level: fine.draw(visible[near]),
+            }
+        glPopMatrix()
+        return sum(self.triangles_drawn.values())
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "level": self.level,
+            "inside": self.inside,
+            "switches": self.switches,
+            "triangles_drawn": dict(self.triangles_drawn),
+            "clusters_submitted": self.submitted,
+            "clusters_culled_frustum": self.culled_frustum,
+            "clusters_culled_backface": self.culled_backface,
+            "triangles_per_level": {key[1]: mesh.triangles
+                                    for key, mesh in self.meshes.meshes.items()},
+            "meshes": self.meshes.stats(),
+        }
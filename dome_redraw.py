@@ -0,0 +1,82 @@
+import pygame
+
+# -------------------------------
+# Idle-aware redraw scheduling for the render loops.
+# The loop takes its input from events() instead of pygame.event.get() and
+# only renders when due() says so. A frame is due when something is dirty:
+#   - any input event (mouse, keys, sliders, window exposure),
+#   - mark(reason) from the loop,
+#   - a change in one of the watched values, registered with
+#     watch(name, value): e.g. a LatestFrameReader's capture counter, a
+#     blink phase or an animation step.
+# When nothing is dirty, events() sleeps in pygame.event.wait() for up to
+# poll_interval (watched values are polled, not pushed) and due() counts
+# the frame as skipped. Presented frames are paced to max_fps like the old
+# clock.tick().
+# -------------------------------
+class RedrawScheduler:
+    def __init__(self, max_fps=30, poll_interval=None):
+        self.max_fps = max_fps
+        self.poll_interval = poll_interval if poll_interval is not None else 1.0 / max_fps
+        self.clock = pygame.time.Clock()
+        self.watched = {}
+        self.values = {}
+        self.dirty = {"first frame"}
+
+        # Counters for the frame statistics.
+        self.frames_presented = 0
+        self.frames_skipped = 0
+        self.reasons = {}
+
+    def watch(self, name, value):
+        self.watched[name] = value
+        self.values[name] = value()
+
+    def mark(self, reason):
+        self.dirty.add(reason)
+
+    def _poll(self):
+        for name, value in self.watched.items():
+            current = value()
+            if current != self.values[name]:
+                self.values[name] = current
+                self.dirty.add(name)
+
+    # -------------------------------
+    # Pending input events; blocks for up to poll_interval when there are
+    # none and nothing else is dirty.
+    # -------------------------------
+    def events(self):
+        events = pygame.event.get()
+        self._poll()
+        if not events and not self.dirty:
+            event = pygame.event.wait(max(1, int(self.poll_interval * 1000)))
+            if event.type != pygame.NOEVENT:
+                events = [event] + pygame.event.get()
+            self._poll()
+        if events:
+            self.dirty.add("input")
+        return events
+
+    # -------------------------------
+    # True if a frame should be rendered now (and clears the dirty set).
+    # -------------------------------
+    def due(self):
+        if not self.dirty:
+            self.frames_skipped += 1
+            return False
+        for reason in self.dirty:
+            self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        self.dirty.clear()
+        self.clock.tick(self.max_fps)
+        self.frames_presented += 1
+        return True
+
+    def stats(self):
+        total = self.frames_presented + self.frames_skipped
+        return {
+            "presented": self.frames_presented,
+            "skipped": self.frames_skipped,
+            "skip_rate": (self.frames_skipped / total) if total else 0.0,
+            "reasons": dict(self.reasons),
+        }
@@ -0,0 +1,457 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+# -------------------------------
+# Frame sources for the dome scripts.
+# Every source behaves like the cv2.VideoCapture the scripts used before
+# (isOpened / read / get / set / release), so LatestFrameReader and the draw
+# code do not care where frames come from. After each successful read(),
+# index is the frame number and timestamp its time in seconds. For files,
+# synthetic frames and replays the timestamp is index / fps (or the recorded
+# value), so two runs of the same scenario see the same frames with the same
+# timestamps. read() accepts an output array like cv2.VideoCapture.read();
+# only the file and device sources decode into it.
+#
+# Pick a source with open_source(spec):
+#   0, "1", "device:1", "device:0@1280x720"   live camera
+#   "file:videos/tree.mp4"                      video file, looped
+#   "synthetic", "synthetic:1280x720@60"        procedural moving shapes
+#   "replay:session.npy"                        raw frames written by the recorder
+#
+# Camera and synthetic specs take a "/yuyv" suffix ("device:0@640x480/yuyv")
+# to deliver packed YUYV 4:2:2 frames of shape (height, width, 2) instead of
+# BGR; TextureStream converts those on the GPU.
+# -------------------------------
+class FrameSource:
+    def __init__(self, width, height, fps, realtime):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.realtime = realtime
+        self.index = -1
+        self.timestamp = None
+        self.started = None
+
+    def isOpened(self):
+        return True
+
+    # -------------------------------
+    # With realtime=True, hold the frame back until its timestamp is due
+    # (like a camera would); otherwise frames come as fast as they are read.
+    # -------------------------------
+    def pace(self, timestamp):
+        if not self.realtime:
+            return
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now - timestamp
+        delay = self.started + timestamp - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.index + 1)
+        return 0.0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        pass
+
+# -------------------------------
+# Live camera. Timestamps are wall-clock seconds since the first frame.
+# -------------------------------
+class DeviceSource(FrameSource):
+    def __init__(self, device=0, width=None, height=None, pixel_format="bgr"):
+        self.cap = cv2.VideoCapture(device)
+        if width and height:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if pixel_format == "yuyv":
+            # Ask for uncompressed YUYV and keep OpenCV from converting it to BGR.
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"YUYV"))
+            self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        FrameSource.__init__(self, int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                             int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                             self.cap.get(cv2.CAP_PROP_FPS) or 30.0, False)
+        self.device = device
+        self.pixel_format = pixel_format
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    # -------------------------------
+    # Raw YUYV arrives as one flat row of bytes; view it as (height, width, 2).
+    # A backend that delivers something else (MJPG, already converted) makes
+    # the source fall back to OpenCV's BGR output.
+    # -------------------------------
+    def unpack(self, image):
+        if image.size == self.width * self.height * 2 and image.ndim < 3:
+            return image.reshape(self.height, self.width, 2)
+        if image.ndim == 3 and image.shape[2] == 3:
+            return image
+        print("Camera %s did not deliver YUYV, falling back to BGR" % self.device)
+        self.pixel_format = "bgr"
+        self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+        return None
+
+    def read(self, image=None):
+        ret, image = self.cap.read(image)
+        if ret and self.pixel_format == "yuyv":
+            image = self.unpack(image)
+            ret = image is not None
+        if ret:
+            now = time.perf_counter()
+            if self.started is None:
+                self.started = now
+            self.index += 1
+            self.timestamp = now - self.started
+        return ret, image
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def release(self):
+        self.cap.release()
+
+# -------------------------------
+# Video file, restarted at the end when loop is set.
+# -------------------------------
+class VideoFileSource(FrameSource):
+    def __init__(self, path, loop=True, realtime=True):
+        self.cap = cv2.VideoCapture(path)
+        FrameSource.__init__(self, int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                             int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                             self.cap.get(cv2.CAP_PROP_FPS) or 30.0, realtime)
+        self.path = path
+        self.loop = loop
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, image=None):
+        ret, image = self.cap.read(image)
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, image = self.cap.read(image)
+        if ret:
+            self.index += 1
+            self.timestamp = self.index / self.fps
+            self.pace(self.timestamp)
+        return ret, image
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+# -------------------------------
+# BGR image to packed YUYV 4:2:2 (BT.601 limited range, chroma averaged over
+# each horizontal pixel pair), the layout a UVC camera delivers.
+# -------------------------------
+def bgr_to_yuyv(image):
+    height, width = image.shape[:2]
+    bgr = image[:, :width & ~1].astype(np.float32) / 255.0
+    b, g, r = bgr[..., 0], bgr[..., 1], bgr[..., 2]
+    y = 16.0 + 65.481 * r + 128.553 * g + 24.966 * b
+    u = 128.0 - 37.797 * r - 74.203 * g + 112.0 * b
+    v = 128.0 + 112.0 * r - 93.786 * g - 18.214 * b
+    packed = np.empty((height, width & ~1, 2), dtype=np.uint8)
+    packed[..., 0] = np.clip(y + 0.5, 0, 255)
+    packed[:, 0::2, 1] = np.clip((u[:, 0::2] + u[:, 1::2]) / 2 + 0.5, 0, 255)
+    packed[:, 1::2, 1] = np.clip((v[:, 0::2] + v[:, 1::2]) / 2 + 0.5, 0, 255)
+    return packed
+
+# -------------------------------
+# Procedural test pattern: a fixed gradient with a few coloured shapes moving
+# on paths drawn from seed. Frame n depends only on (seed, n), never on time.
+# frames limits the stream length (None = endless).
+# -------------------------------
+class SyntheticSource(FrameSource):
+    def __init__(self, width=640, height=480, fps=30.0, seed=0, shapes=6, realtime=True,
+                 frames=None, pixel_format="bgr"):
+        FrameSource.__init__(self, width, height, fps, realtime)
+        self.seed = seed
+        self.frames = frames
+        self.pixel_format = pixel_format
+        rng = np.random.default_rng(seed)
+        ramp_x = np.linspace(40, 120, width, dtype=np.float32)
+        ramp_y = np.linspace(20, 90, height, dtype=np.float32)
+        self.background = np.empty((height, width, 3), dtype=np.uint8)
+        self.background[..., 0] = ramp_x[None, :]
+        self.background[..., 1] = ramp_y[:, None]
+        self.background[..., 2] = 60
+        # Per shape: centre, orbit radii, angular speed, phase, size, colour.
+        self.paths = []
+        for _ in range(shapes):
+            self.paths.append((rng.uniform(0.2, 0.8, 2), rng.uniform(0.05, 0.3, 2),
+                               rng.uniform(0.2, 2.0), rng.uniform(0, 2 * math.pi),
+                               int(rng.integers(8, max(9, min(width, height) // 6))),
+                               tuple(int(c) for c in rng.integers(0, 256, 3))))
+
+    def render(self, index):
+        image = self.background.copy()
+        t = index / self.fps
+        for k, (centre, orbit, speed, phase, size, colour) in enumerate(self.paths):
+            angle = phase + speed * t
+            x = int((centre[0] + orbit[0] * math.cos(angle)) * self.width)
+            y = int((centre[1] + orbit[1] * math.sin(angle)) * self.height)
+            if k % 2:
+                cv2.rectangle(image, (x - size, y - size), (x + size, y + size), colour, -1)
+            else:
+                cv2.circle(image, (x, y), size, colour, -1)
+        # Frame counter, so dropped or repeated frames are visible on the dome.
+        cv2.putText(image, str(index), (10, self.height - 10), cv2.FONT_HERSHEY_SIMPLEX,
+                    max(0.5, self.height / 480.0), (255, 255, 255), 2)
+        return image
+
+    def read(self, image=None):
+        if self.frames is not None and self.index + 1 >= self.frames:
+            return False, None
+        self.index += 1
+        self.timestamp = self.index / self.fps
+        image = self.render(self.index)
+        if self.pixel_format == "yuyv":
+            image = bgr_to_yuyv(image)
+        self.pace(self.timestamp)
+        return True, image
+
+# -------------------------------
+# Replay of a raw recording: frames live in an .npy file of shape
+# (count, height, width, 3) (2 channels for YUYV) and their timestamps in the
+# matching ".times.npy" file (NaN marks slots that were never written). Both are
+# memory-mapped, and read() returns views into the mapping, not copies.
+# -------------------------------
+def replay_times_path(path):
+    base, _ = os.path.splitext(path)
+    return base + ".times.npy"
+
+class ReplaySource(FrameSource):
+    def __init__(self, path, loop=True, realtime=True):
+        self.path = path
+        self.loop = loop
+        self.frames = None
+        self.times = None
+        self.count = 0
+        if os.path.exists(path):
+            self.frames = np.load(path, mmap_mode="r")
+            times_path = replay_times_path(path)
+            if os.path.exists(times_path):
+                times = np.load(times_path, mmap_mode="r")
+                written = np.flatnonzero(np.isnan(times))
+                self.count = int(written[0]) if len(written) else len(times)
+                self.times = np.asarray(times[:self.count], dtype=np.float64)
+            else:
+                self.count = len(self.frames)
+        height, width = self.frames.shape[1:3] if self.frames is not None else (0, 0)
+        fps = 30.0
+        if self.times is not None and self.count > 1:
+            fps = (self.count - 1) / max(self.times[-1] - self.times[0], 1e-6)
+        FrameSource.__init__(self, width, height, fps, realtime)
+        self.loops = 0
+
+    def isOpened(self):
+        return self.count > 0
+
+    def read(self, image=None):
+        position = self.index + 1 - self.loops * self.count
+        if position >= self.count:
+            if not self.loop or self.count == 0:
+                return False, None
+            self.loops += 1
+            position = 0
+        self.index += 1
+        if self.times is not None:
+            # Keep timestamps increasing across loops.
+            span = self.times[-1] - self.times[0] + 1.0 / self.fps
+            self.timestamp = self.times[position] - self.times[0] + self.loops * span
+        else:
+            self.timestamp = self.index / self.fps
+        self.pace(self.timestamp)
+        return True, self.frames[position]
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.count)
+        return FrameSource.get(self, prop)
+
+    def release(self):
+        self.frames = None
+        self.times = None
+        self.count = 0
+
+# -------------------------------
+# Records raw frames in the format ReplaySource reads.
+# Both .npy files are preallocated for max_frames and memory-mapped when the
+# first frame arrives (its size fixes the recording's size; later frames of
+# another size are scaled to it). record() never blocks: it queues a
+# reference to the frame and returns, and a writer thread copies queued
+# frames into the mapping. When the writer falls queue_depth frames behind,
+# or the file is full, new frames are dropped and counted instead.
+# Timestamps are written after their frame, so a replay never sees a slot
+# that is only half written.
+# -------------------------------
+class FrameRecorder:
+    def __init__(self, path, max_frames=1800, queue_depth=8):
+        self.path = path
+        self.max_frames = max_frames
+        self.queue_depth = queue_depth
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.frames = None
+        self.times = None
+        self.first_timestamp = None
+        self.running = True
+
+        # Counters (read them through stats()).
+        self.queued = 0
+        self.recorded = 0
+        self.dropped_busy = 0
+        self.dropped_full = 0
+        self.queue_max = 0
+        self.bytes_written = 0
+
+        self.thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self.thread.start()
+
+    # -------------------------------
+    # Queue one BGR frame. The caller must not modify image afterwards
+    # (cap.read() returns a new array per frame, so capture threads can pass
+    # it straight through). Returns False if the frame was dropped.
+    # -------------------------------
+    def record(self, image, timestamp=None):
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        with self.cond:
+            if not self.running:
+                return False
+            if self.queued >= self.max_frames:
+                self.dropped_full += 1
+                return False
+            if len(self.queue) >= self.queue_depth:
+                self.dropped_busy += 1
+                return False
+            self.queue.append((image, timestamp))
+            self.queued += 1
+            self.queue_max = max(self.queue_max, len(self.queue))
+            self.cond.notify()
+        return True
+
+    def _open(self, shape):
+        self.frames = np.lib.format.open_memmap(self.path, mode="w+", dtype=np.uint8,
+                                                shape=(self.max_frames,) + shape)
+        self.times = np.lib.format.open_memmap(replay_times_path(self.path), mode="w+",
+                                               dtype=np.float64, shape=(self.max_frames,))
+        self.times[:] = np.nan
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and not self.queue:
+                    self.cond.wait()
+                if not self.queue:
+                    break
+                image, timestamp = self.queue.popleft()
+            if self.frames is None:
+                self._open(image.shape)
+                self.first_timestamp = timestamp
+            slot = self.frames[self.recorded]
+            if image.shape != slot.shape:
+                image = cv2.resize(image, (slot.shape[1], slot.shape[0]),
+                                   interpolation=cv2.INTER_AREA)
+            slot[...] = image
+            self.times[self.recorded] = timestamp - self.first_timestamp
+            self.recorded += 1
+            self.bytes_written += slot.nbytes
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "recorded": self.recorded,
+            "dropped_busy": self.dropped_busy,
+            "dropped_full": self.dropped_full,
+            "queue_max": self.queue_max,
+            "bytes_written": self.bytes_written,
+        }
+
+    # -------------------------------
+    # Write out everything still queued, flush the files and stop the writer.
+    # -------------------------------
+    def close(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join()
+        if self.frames is not None:
+            self.frames.flush()
+            self.times.flush()
+            self.frames = None
+            self.times = None
+
+# -------------------------------
+# FrameRecorder for path, or None when path is empty (e.g. DOME_RECORD unset).
+# -------------------------------
+def open_recorder(path, max_frames=1800):
+    if not path:
+        return None
+    return FrameRecorder(path, max_frames)
+
+# -------------------------------
+# "WxH" or "WxH@fps" -> (width, height, fps); missing parts stay None.
+# -------------------------------
+def parse_mode(text):
+    width = height = fps = None
+    if "@" in text:
+        text, fps = text.split("@", 1)
+        fps = float(fps)
+    if text:
+        width, height = [int(v) for v in text.lower().split("x")]
+    return width, height, fps
+
+# -------------------------------
+# Build a frame source from a spec string (see the top of this file).
+# A bare integer is a camera index, anything else without a known prefix is
+# treated as a video file. realtime and loop apply to the non-live sources;
+# decoders that pace themselves (VideoDecodePool, ClipCache) pass
+# realtime=False.
+# -------------------------------
+def open_source(spec, realtime=True, loop=True):
+    if isinstance(spec, int):
+        return DeviceSource(spec)
+    spec = str(spec)
+    kind, _, arg = spec.partition(":")
+    if spec.isdigit():
+        return DeviceSource(int(spec))
+    if kind == "device":
+        arg, _, pixel_format = arg.partition("/")
+        device, _, mode = arg.partition("@")
+        width, height, _ = parse_mode(mode)
+        return DeviceSource(int(device or 0), width, height, pixel_format or "bgr")
+    if kind == "file":
+        return VideoFileSource(arg, loop, realtime)
+    if kind == "synthetic":
+        arg, _, pixel_format = arg.partition("/")
+        width, height, fps = parse_mode(arg)
+        return SyntheticSource(width or 640, height or 480, fps or 30.0, realtime=realtime,
+                               pixel_format=pixel_format or "bgr")
+    if kind == "replay":
+        return ReplaySource(arg, loop, realtime)
+    return VideoFileSource(spec, loop, realtime)
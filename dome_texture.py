@@ -0,0 +1,666 @@
+import ctypes
+import os
+from collections import deque
+
+import cv2
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.error import GLError, NullFunctionError
+
+# Upload mode used when a TextureStream does not ask for one:
+# "direct" copies from client memory, "pbo" goes through rotating pixel buffer objects.
+DEFAULT_UPLOAD_MODE = os.environ.get("DOME_UPLOAD_MODE", "direct")
+
+# Pixel path used when a TextureStream does not ask for one:
+# "bgr" hands the camera frame to GL as-is (GL_BGR, flipped in texture coordinates),
+# "rgb" is the old cv2.flip + cv2.cvtColor + tobytes path.
+DEFAULT_PIXEL_PATH = os.environ.get("DOME_PIXEL_PATH", "bgr")
+
+# -------------------------------
+# (major, minor) of the current context, or (0, 0) if it cannot be read.
+# -------------------------------
+def gl_version():
+    try:
+        version = glGetString(GL_VERSION)
+    except (GLError, NullFunctionError):
+        return (0, 0)
+    if not version:
+        return (0, 0)
+    try:
+        major, minor = [int(v) for v in version.split()[0].split(b".")[:2]]
+    except ValueError:
+        return (0, 0)
+    return (major, minor)
+
+def gl_has_extension(name):
+    try:
+        extensions = glGetString(GL_EXTENSIONS) or b""
+    except (GLError, NullFunctionError):
+        return False
+    return name.encode() in extensions.split()
+
+# -------------------------------
+# Check whether the current context can stream through pixel buffer objects.
+# Needs GL 2.1 (or ARB_pixel_buffer_object) and glMapBufferRange.
+# -------------------------------
+def pbo_supported():
+    try:
+        if not (bool(glGenBuffers) and bool(glMapBufferRange)):
+            return False
+    except NullFunctionError:
+        return False
+    return gl_version() >= (2, 1) or gl_has_extension("GL_ARB_pixel_buffer_object")
+
+# -------------------------------
+# GL_BGR is core since GL 1.2; older drivers may still expose EXT_bgra.
+# -------------------------------
+def bgr_supported():
+    return gl_version() >= (1, 2) or gl_has_extension("GL_EXT_bgra")
+
+# -------------------------------
+# Grey checkerboard (BGR) shown in place of a feed that has not delivered a
+# frame yet.
+# -------------------------------
+def placeholder_pattern(width=64, height=64, tile=8):
+    y, x = np.mgrid[0:height, 0:width]
+    checker = ((x // tile + y // tile) % 2).astype(np.uint8)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[...] = (70 + 50 * checker)[..., None]
+    return image
+
+# -------------------------------
+# How the current context can build mip chains for a streamed texture:
+# "generate" (glGenerateMipmap, GL 3.0 / ARB_framebuffer_object), "auto"
+# (GL_GENERATE_MIPMAP texture parameter, GL 1.4) or None.
+# -------------------------------
+def mipmap_mode():
+    try:
+        if bool(glGenerateMipmap) and (gl_version() >= (3, 0) or
+                                       gl_has_extension("GL_ARB_framebuffer_object")):
+            return "generate"
+    except NullFunctionError:
+        pass
+    if gl_version() >= (1, 4):
+        return "auto"
+    return None
+
+# -------------------------------
+# GLSL 1.20 program that samples a packed YUYV frame and outputs RGB.
+# The frame is stored as a width/2 x height RGBA texture (one texel = Y0 U Y1 V)
+# with nearest filtering; the shader picks the right Y per pixel, filters
+# luma bilinearly itself and converts BT.601 limited-range YUV to RGB.
+# It uses the fixed-function built-ins (ftransform, gl_TextureMatrix,
+# gl_Color), so it drops into the immediate-mode draw code and runs on
+# Mesa llvmpipe.
+# -------------------------------
+YUYV_VERTEX_SHADER = """
+#version 120
+void main() {
+    gl_TexCoord[0] = gl_TextureMatrix[0] * gl_MultiTexCoord0;
+    gl_FrontColor = gl_Color;
+    gl_Position = ftransform();
+}
+"""
+
+YUYV_FRAGMENT_SHADER = """
+#version 120
+uniform sampler2D yuyv;
+uniform vec2 size;  // Frame size in pixels (the texture is size.x / 2 wide)
+
+float luma(vec2 p) {
+    p = clamp(p, vec2(0.0), size - 1.0);
+    vec4 texel = texture2D(yuyv, vec2((floor(p.x / 2.0) + 0.5) / (size.x / 2.0),
+                                      (p.y + 0.5) / size.y));
+    return mod(p.x, 2.0) < 1.0 ? texel.r : texel.b;
+}
+
+void main() {
+    vec2 st = gl_TexCoord[0].st;
+    vec2 p = st * size - 0.5;
+    vec2 f = fract(p);
+    p = floor(p);
+    float y = mix(mix(luma(p), luma(p + vec2(1.0, 0.0)), f.x),
+                  mix(luma(p + vec2(0.0, 1.0)), luma(p + vec2(1.0, 1.0)), f.x), f.y);
+    vec2 pairs = vec2(size.x / 2.0, size.y);
+    vec4 chroma = texture2D(yuyv, (floor(st * pairs) + 0.5) / pairs);
+    float u = chroma.g - 0.5;
+    float v = chroma.a - 0.5;
+    y = 1.164 * (y - 0.0625);
+    vec3 rgb = vec3(y + 1.596 * v, y - 0.392 * u - 0.813 * v, y + 2.017 * u);
+    gl_FragColor = vec4(clamp(rgb, 0.0, 1.0), 1.0) * gl_Color;
+}
+"""
+
+yuyv_programs = {}
+
+# -------------------------------
+# The YUYV program for the current context, or None if it cannot be built
+# (no GLSL 1.20, compile error); callers then convert on the CPU.
+# -------------------------------
+def yuyv_program():
+    from OpenGL.GL import shaders
+    key = gl_version()
+    if key not in yuyv_programs:
+        program = None
+        if key >= (2, 1):
+            try:
+                program = shaders.compileProgram(
+                    shaders.compileShader(YUYV_VERTEX_SHADER, GL_VERTEX_SHADER),
+                    shaders.compileShader(YUYV_FRAGMENT_SHADER, GL_FRAGMENT_SHADER),
+                    validate=False)
+            except (RuntimeError, GLError, NullFunctionError) as error:
+                print("YUYV shader unavailable, converting on the CPU:", error)
+        yuyv_programs[key] = program
+    return yuyv_programs[key]
+
+# -------------------------------
+# A streaming texture for one camera or video feed.
+# Storage is allocated once per resolution with glTexImage2D(..., None)
+# and every new frame is written with glTexSubImage2D. Filter parameters
+# are only set when the storage is (re)allocated. If the caller passes the
+# frame's sequence number, a frame that was already uploaded is skipped.
+#
+# With upload_mode="pbo" each frame is copied into one of pbo_count (2 or 3)
+# rotating pixel buffer objects and the texture is updated from the buffer
+# filled on an earlier call, so the transfer overlaps with rendering. The
+# texture then lags the camera by pbo_count - 1 frames. The first frame after
+# a (re)allocation is uploaded directly, so the new storage is never drawn
+# empty. So is a frame whose PBO cannot be mapped, or whose contents the
+# driver lost before it was unmapped (counted as pbo_failures). If the
+# context has no PBO support the stream falls back to the direct path.
+#
+# With pixel_path="bgr" the BGR array from cap.read() is uploaded without any
+# CPU conversion and bind() flips it vertically through the texture matrix,
+# so draw code must bind with bind() rather than glBindTexture.
+#
+# With mipmaps=True the mip chain is rebuilt after every upload and the
+# texture is sampled with trilinear filtering, so a feed that is small on
+# screen does not alias.
+#
+# Frames of shape (height, width, 2) are raw YUYV (see dome_sources): they
+# are uploaded packed, 2 bytes per pixel, and bind() switches to the YUYV
+# shader to convert them while sampling. Call unbind() after drawing.
+# Without shader support they are converted with cv2.cvtColor instead.
+# -------------------------------
+class TextureStream:
+    def __init__(self, texture_id=None, upload_mode=None, pbo_count=2, pixel_path=None,
+                 mipmaps=False):
+        self.texture_id = texture_id
+        self.width = 0
+        self.height = 0
+        self.seq = None
+        self.upload_mode = upload_mode or DEFAULT_UPLOAD_MODE
+        self.pbo_count = max(2, min(3, pbo_count))
+        self.pbos = []
+        self.pbo_size = 0
+        self.pbo_next = 0
+        self.pbo_pending = deque()
+        self.pixel_path = pixel_path or DEFAULT_PIXEL_PATH
+        self.mipmaps = mipmaps
+        self.mipmap_mode = None
+        self.yuyv = False
+        self.upload_size = (0, 0)
+
+        # Counters for the frame statistics.
+        self.allocations = 0
+        self.uploads = 0
+        self.skipped = 0
+        self.bytes_copied = 0
+        self.pbo_failures = 0
+
+    def _allocate(self, width, height, yuyv=False):
+        if self.texture_id is None:
+            texture_id = glGenTextures(1)
+            # Some versions of PyOpenGL return a list.
+            if isinstance(texture_id, (list, tuple)):
+                texture_id = texture_id[0]
+            self.texture_id = texture_id
+        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        self.yuyv = yuyv
+        if yuyv:
+            # Packed pairs; the shader filters, so sample texels exactly.
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            if self.mipmap_mode == "auto":
+                glTexParameteri(GL_TEXTURE_2D, GL_GENERATE_MIPMAP, GL_FALSE)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width // 2, height,
+                         0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+            self.width = width
+            self.height = height
+            self.upload_size = (width // 2, height)
+            self.allocations += 1
+            if self.upload_mode == "pbo":
+                self._allocate_pbos(width * height * 2)
+            return
+        if self.mipmaps and self.mipmap_mode is None:
+            self.mipmap_mode = mipmap_mode()
+            if self.mipmap_mode is None:
+                print("Mipmap generation unavailable, using bilinear filtering")
+                self.mipmaps = False
+        if self.mipmaps:
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+            if self.mipmap_mode == "auto":
+                glTexParameteri(GL_TEXTURE_2D, GL_GENERATE_MIPMAP, GL_TRUE)
+        else:
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, width, height,
+                     0, GL_RGB, GL_UNSIGNED_BYTE, None)
+        self.width = width
+        self.height = height
+        self.upload_size = (width, height)
+        self.allocations += 1
+        if self.pixel_path == "bgr" and not bgr_supported():
+            print("GL_BGR uploads unavailable, converting frames on the CPU")
+            self.pixel_path = "rgb"
+        if self.upload_mode == "pbo":
+            self._allocate_pbos(width * height * 3)
+
+    def _allocate_pbos(self, size):
+        self._release_pbos()
+        if not pbo_supported():
+            print("Pixel buffer objects unavailable, using direct texture uploads")
+            self.upload_mode = "direct"
+            return
+        self.pbos = [int(b) for b in glGenBuffers(self.pbo_count)]
+        for pbo in self.pbos:
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_UNPACK_BUFFER, size, None, GL_STREAM_DRAW)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        self.pbo_size = size
+        self.pbo_next = 0
+        self.pbo_pending.clear()
+
+    def _release_pbos(self):
+        if self.pbos:
+            glDeleteBuffers(len(self.pbos), self.pbos)
+        self.pbos = []
+        self.pbo_pending.clear()
+
+    # -------------------------------
+    # Start the texture transfer from the oldest filled PBO.
+    # The source is GPU-side, so the call returns without waiting for the copy.
+    # -------------------------------
+    def _upload_pending_pbo(self):
+        pbo, pixel_format = self.pbo_pending.popleft()
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, pbo)
+        glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, self.upload_size[0], self.upload_size[1],
+                        pixel_format, GL_UNSIGNED_BYTE, None)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        self._generate_mipmaps()
+        self.uploads += 1
+
+    def _generate_mipmaps(self):
+        if self.mipmaps and self.mipmap_mode == "generate" and not self.yuyv:
+            glGenerateMipmap(GL_TEXTURE_2D)
+
+    # -------------------------------
+    # Copy a contiguous frame into the next PBO. Returns False if the buffer
+    # could not be mapped or its contents were lost.
+    # Orphaning the store first means we never wait on a transfer still in flight.
+    # -------------------------------
+    def _fill_pbo(self, frame, pixel_format):
+        pbo = self.pbos[self.pbo_next]
+        self.pbo_next = (self.pbo_next + 1) % len(self.pbos)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, pbo)
+        glBufferData(GL_PIXEL_UNPACK_BUFFER, self.pbo_size, None, GL_STREAM_DRAW)
+        ptr = glMapBufferRange(GL_PIXEL_UNPACK_BUFFER, 0, self.pbo_size,
+                               GL_MAP_WRITE_BIT | GL_MAP_INVALIDATE_BUFFER_BIT)
+        filled = False
+        if ptr:
+            ctypes.memmove(ptr, frame.ctypes.data, self.pbo_size)
+            self.bytes_copied += self.pbo_size
+            # GL_FALSE: the store was corrupted while mapped (e.g. a mode switch).
+            filled = bool(glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER))
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        if not filled:
+            self.pbo_failures += 1
+            return False
+        self.pbo_pending.append((pbo, pixel_format))
+        return True
+
+    # -------------------------------
+    # Upload a BGR frame (as returned by cap.read()) or a packed YUYV frame.
+    # Returns True if the texture content changed.
+    # -------------------------------
+    def update(self, frame, seq=None):
+        if seq is not None and seq == self.seq:
+            if self.pbo_pending:
+                # No new frame, but an earlier one is still waiting in a PBO.
+                glBindTexture(GL_TEXTURE_2D, self.texture_id)
+                glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+                self._upload_pending_pbo()
+                return True
+            self.skipped += 1
+            return False
+        yuyv = frame.ndim == 3 and frame.shape[2] == 2
+        if yuyv and (self.pixel_path != "bgr" or yuyv_program() is None):
+            frame = cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_YUYV)
+            self.bytes_copied += frame.nbytes
+            yuyv = False
+        height, width = frame.shape[:2]
+        reallocated = (width, height, yuyv) != (self.width, self.height, self.yuyv)
+        if reallocated:
+            self._allocate(width, height, yuyv)
+        else:
+            glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        self.seq = seq
+        if yuyv:
+            pixel_format = GL_RGBA
+            if not frame.flags["C_CONTIGUOUS"]:
+                frame = np.ascontiguousarray(frame)
+                self.bytes_copied += frame.nbytes
+        elif self.pixel_path == "bgr":
+            pixel_format = GL_BGR
+            if not frame.flags["C_CONTIGUOUS"]:
+                frame = np.ascontiguousarray(frame)
+                self.bytes_copied += frame.nbytes
+        else:
+            # Flip vertically and convert from BGR to RGB.
+            pixel_format = GL_RGB
+            frame = cv2.flip(frame, 0)
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            self.bytes_copied += 2 * frame.nbytes
+        # Fresh storage has no content yet, so the first frame after a
+        # (re)allocation is uploaded directly rather than a frame late.
+        if self.upload_mode == "pbo" and not reallocated:
+            changed = len(self.pbo_pending) >= self.pbo_count - 1
+            if changed:
+                self._upload_pending_pbo()
+            if self._fill_pbo(frame, pixel_format):
+                return changed
+            # Upload this frame directly; the frames still pending are older.
+            self.pbo_pending.clear()
+        if self.pixel_path == "bgr":
+            # PyOpenGL passes a contiguous uint8 array straight through to the driver.
+            pixels = frame
+        else:
+            pixels = frame.tobytes()
+            self.bytes_copied += frame.nbytes
+        glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, self.upload_size[0], self.upload_size[1],
+                        pixel_format, GL_UNSIGNED_BYTE, pixels)
+        self._generate_mipmaps()
+        self.uploads += 1
+        return True
+
+    # -------------------------------
+    # Bind the texture for drawing. Frames uploaded on the "bgr" path keep
+    # OpenCV's top-down row order, so the texture matrix flips t instead.
+    # Until the first frame arrives the texture holds placeholder_pattern().
+    # YUYV frames also enable the conversion shader until unbind().
+    # Leaves the modelview matrix selected, as the draw code expects.
+    # -------------------------------
+    def bind(self):
+        if self.texture_id is None or self.width == 0:
+            self._show_placeholder()
+        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        glMatrixMode(GL_TEXTURE)
+        glLoadIdentity()
+        if self.pixel_path == "bgr":
+            glTranslatef(0, 1, 0)
+            glScalef(1, -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        if self.yuyv:
+            program = yuyv_program()
+            glUseProgram(program)
+            glUniform1i(glGetUniformLocation(program, "yuyv"), 0)
+            glUniform2f(glGetUniformLocation(program, "size"), self.width, self.height)
+
+    def unbind(self):
+        if self.yuyv:
+            glUseProgram(0)
+
+    def _show_placeholder(self):
+        pattern = placeholder_pattern()
+        self._allocate(pattern.shape[1], pattern.shape[0])
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, pattern.shape[1], pattern.shape[0],
+                        GL_RGB, GL_UNSIGNED_BYTE, pattern)
+        self._generate_mipmaps()
+
+    def stats(self):
+        return {
+            "mode": self.upload_mode,
+            "pixel_path": "yuyv" if self.yuyv else self.pixel_path,
+            "mipmaps": self.mipmap_mode if self.mipmaps and not self.yuyv else None,
+            "width": self.width,
+            "height": self.height,
+            "allocations": self.allocations,
+            "uploads": self.uploads,
+            "skipped": self.skipped,
+            "bytes_copied": self.bytes_copied,
+            "pbo_failures": self.pbo_failures,
+        }
+
+    def release(self):
+        self._release_pbos()
+        if self.texture_id is not None:
+            glDeleteTextures([self.texture_id])
+            self.texture_id = None
+        self.width = self.height = 0
+
+# -------------------------------
+# One texture holding every live feed in a fixed grid of cells.
+# Each source gets the lowest free cell when it is added and keeps it until
+# it is removed, so adding or removing a source never moves the others.
+# Frames are scaled to the cell size and written with glTexSubImage2D.
+# Draw code binds the atlas once and maps each quad's (s, t) into its
+# source's cell with uv(); version changes whenever the mapping changes.
+# -------------------------------
+class FeedAtlas:
+    def __init__(self, cell_width=640, cell_height=480, columns=3, rows=2, pixel_path=None):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.columns = columns
+        self.rows = rows
+        self.width = cell_width * columns
+        self.height = cell_height * rows
+        self.pixel_path = pixel_path or DEFAULT_PIXEL_PATH
+        self.texture_id = None
+        self.cells = {}
+        self.version = 0
+
+        # Counters for the frame statistics.
+        self.uploads = 0
+        self.skipped = 0
+        self.resized = 0
+
+    def _allocate(self):
+        texture_id = glGenTextures(1)
+        if isinstance(texture_id, (list, tuple)):
+            texture_id = texture_id[0]
+        self.texture_id = texture_id
+        if self.pixel_path == "bgr" and not bgr_supported():
+            print("GL_BGR uploads unavailable, converting frames on the CPU")
+            self.pixel_path = "rgb"
+        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        # Start with the placeholder pattern so cells without a frame yet show it.
+        pattern = placeholder_pattern(self.width, self.height, tile=32)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, self.width, self.height,
+                     0, GL_RGB, GL_UNSIGNED_BYTE, pattern)
+
+    def add(self, name):
+        if name in self.cells:
+            return self.cells[name]
+        used = set(cell.index for cell in self.cells.values())
+        free = [i for i in range(self.columns * self.rows) if i not in used]
+        if not free:
+            raise ValueError("Feed atlas is full (%d cells)" % (self.columns * self.rows))
+        cell = AtlasCell(self, name, free[0])
+        self.cells[name] = cell
+        self.version += 1
+        return cell
+
+    def remove(self, name):
+        if self.cells.pop(name, None) is not None:
+            self.version += 1
+
+    # -------------------------------
+    # Atlas texture coordinates for (s, t) inside the named source's cell.
+    # t = 0 is the bottom of the camera image, as for a single feed texture.
+    # A half-texel inset keeps linear filtering from bleeding between cells.
+    # -------------------------------
+    def uv(self, name, s, t):
+        cell = self.cells[name]
+        x0 = cell.x + 0.5
+        x1 = cell.x + self.cell_width - 0.5
+        y0 = cell.y + 0.5
+        y1 = cell.y + self.cell_height - 0.5
+        u = (x0 + s * (x1 - x0)) / self.width
+        if self.pixel_path == "bgr":
+            # Rows are stored top-down, so the image bottom is the cell's last row.
+            v = (y1 - t * (y1 - y0)) / self.height
+        else:
+            v = (y0 + t * (y1 - y0)) / self.height
+        return u, v
+
+    def bind(self):
+        if self.texture_id is None:
+            self._allocate()
+        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        glMatrixMode(GL_TEXTURE)
+        glLoadIdentity()
+        glMatrixMode(GL_MODELVIEW)
+
+    def stats(self):
+        return {
+            "cells": len(self.cells),
+            "capacity": self.columns * self.rows,
+            "uploads": self.uploads,
+            "skipped": self.skipped,
+            "resized": self.resized,
+        }
+
+# -------------------------------
+# A source's cell in a FeedAtlas. Has the same update()/bind() interface as
+# TextureStream so FeedCache can drive either.
+# -------------------------------
+class AtlasCell:
+    def __init__(self, atlas, name, index):
+        self.atlas = atlas
+        self.name = name
+        self.index = index
+        self.x = (index % atlas.columns) * atlas.cell_width
+        self.y = (index // atlas.columns) * atlas.cell_height
+        self.seq = None
+
+    def update(self, frame, seq=None):
+        atlas = self.atlas
+        if seq is not None and seq == self.seq:
+            atlas.skipped += 1
+            return False
+        if atlas.texture_id is None:
+            atlas._allocate()
+        if frame.ndim == 3 and frame.shape[2] == 2:
+            # Raw YUYV: cells share one RGB texture, so convert on the CPU.
+            frame = cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_YUYV)
+        if frame.shape[0] != atlas.cell_height or frame.shape[1] != atlas.cell_width:
+            frame = cv2.resize(frame, (atlas.cell_width, atlas.cell_height),
+                               interpolation=cv2.INTER_AREA)
+            atlas.resized += 1
+        if atlas.pixel_path == "bgr":
+            pixel_format = GL_BGR
+            frame = np.ascontiguousarray(frame)
+        else:
+            pixel_format = GL_RGB
+            frame = cv2.cvtColor(cv2.flip(frame, 0), cv2.COLOR_BGR2RGB)
+        glBindTexture(GL_TEXTURE_2D, atlas.texture_id)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexSubImage2D(GL_TEXTURE_2D, 0, self.x, self.y, atlas.cell_width, atlas.cell_height,
+                        pixel_format, GL_UNSIGNED_BYTE, frame)
+        self.seq = seq
+        atlas.uploads += 1
+        return True
+
+    def bind(self):
+        self.atlas.bind()
+
+    def unbind(self):
+        pass
+
+# -------------------------------
+# Per-render-tick cache of every live feed.
+# advance() is called once per rendered frame: it pulls one frame from each
+# source and uploads it into that source's TextureStream. Draw code only
+# calls bind(name), so no source is decoded more than once per tick however
+# many quads sample it. read() returns (frame, seq) or None; seq may be None
+# for sources that always produce a new frame (video files).
+# -------------------------------
+class FeedCache:
+    def __init__(self):
+        self.names = []
+        self.readers = {}
+        self.streams = {}
+        self.ready = {}
+        self.placeholders = {}
+        self.seqs = {}
+
+        # Frame counters: decodes_last_tick is at most len(names); a frame
+        # counts as decoded when its seq is new (or None).
+        self.ticks = 0
+        self.decodes_last_tick = 0
+        self.decodes_total = 0
+
+    # -------------------------------
+    # Register a source. It gets its own TextureStream unless a stream is
+    # given (for example an AtlasCell from FeedAtlas.add()). With
+    # placeholder=True, bind() shows the stream's placeholder pattern until
+    # the first frame instead of returning False.
+    # -------------------------------
+    def add(self, name, read, texture_id=None, stream=None, placeholder=False):
+        self.names.append(name)
+        self.readers[name] = read
+        self.streams[name] = stream or TextureStream(texture_id)
+        self.ready[name] = False
+        self.placeholders[name] = placeholder
+        self.seqs[name] = None
+
+    def remove(self, name):
+        if name in self.readers:
+            self.names.remove(name)
+            del self.readers[name]
+            del self.streams[name]
+            del self.ready[name]
+            del self.placeholders[name]
+            del self.seqs[name]
+
+    def advance(self):
+        decodes = 0
+        for name in self.names:
+            frame = self.readers[name]()
+            if frame is not None:
+                if frame[1] is None or frame[1] != self.seqs[name]:
+                    decodes += 1
+                self.seqs[name] = frame[1]
+                self.streams[name].update(frame[0], frame[1])
+                self.ready[name] = True
+        self.ticks += 1
+        self.decodes_last_tick = decodes
+        self.decodes_total += decodes
+
+    # -------------------------------
+    # Bind the named feed; returns False until it has produced a frame
+    # (unless it was added with placeholder=True).
+    # -------------------------------
+    def bind(self, name):
+        if not self.ready.get(name) and not self.placeholders.get(name):
+            return False
+        self.streams[name].bind()
+        return True
+
+    def unbind(self, name):
+        self.streams[name].unbind()
+
+    def stats(self):
+        return {
+            "sources": len(self.names),
+            "ticks": self.ticks,
+            "decodes_last_tick": self.decodes_last_tick,
+            "decodes_per_tick": (self.decodes_total / self.ticks) if self.ticks else 0.0,
+        }
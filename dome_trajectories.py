@@ -0,0 +1,583 @@
+import math
+import time
+
+import numpy as np
+from OpenGL.GL import *
+
+# -------------------------------
+# Trajectory geometry for the webcam dome scripts.
+# All trajectories of a frame are quadratic Bézier curves evaluated together
+# with NumPy: start, control and end points come in as (N, 3) arrays and the
+# curves come out as one (N, S+1, 3) vertex array, so the whole batch is
+# drawn with a single glMultiDrawArrays call instead of one glBegin/glEnd
+# pair and S+1 glVertex3f calls per curve.
+#
+# Curves can also be tessellated adaptively (segment_counts and
+# tessellate_pieces): each gets just enough segments to stay within a
+# flatness tolerance in window pixels at the current zoom level, and is
+# split exactly at its dome entry and exit so the inside/outside colour
+# change is crisp. The result is a ragged batch of strips (vertices,
+# inside mask, first, counts).
+# -------------------------------
+
+TRAJECTORY_OUTSIDE_COLOUR = (0.0, 1.0, 0.0)
+
+# -------------------------------
+# Points of N quadratic Béziers at S+1 evenly spaced parameters.
+# Returns a float32 array of shape (N, S+1, 3).
+# -------------------------------
+def bezier_points(p0, p1, p2, segments):
+    controls = np.stack([p0, p1, p2], axis=1).astype(np.float32)
+    return bezier_weights(segments) @ controls
+
+# -------------------------------
+# Bernstein weights of the S+1 parameters, shape (S+1, 3); one matrix
+# product with the (N, 3, 3) control points evaluates the whole batch.
+# -------------------------------
+_weights = {}
+
+def bezier_weights(segments):
+    if segments not in _weights:
+        t = np.linspace(0.0, 1.0, segments + 1)
+        _weights[segments] = np.stack([(1 - t) ** 2, 2 * (1 - t) * t, t * t], axis=1).astype(np.float32)
+    return _weights[segments]
+
+# -------------------------------
+# Mask of the S+1 evenly spaced vertices of each curve that lie between
+# its dome entry and exit parameters (see dome_crossings), shape (N, S+1).
+# -------------------------------
+def crossing_mask(t_entry, t_exit, segments):
+    t = np.linspace(0.0, 1.0, segments + 1)
+    return (t >= t_entry[:, None]) & (t <= t_exit[:, None])
+
+# -------------------------------
+# Points of N quadratic Béziers at one parameter each, t of shape (N,).
+# -------------------------------
+def bezier_at(p0, p1, p2, t):
+    return bezier_points_at(p0, p1, p2, np.asarray(t, dtype=np.float64)[:, None])[:, 0]
+
+# -------------------------------
+# Points of N quadratic Béziers at per-curve parameters t of shape (N, M).
+# Returns shape (N, M, 3) in float64.
+# -------------------------------
+def bezier_points_at(p0, p1, p2, t):
+    t = t[..., None]
+    return ((1 - t) ** 2 * np.asarray(p0, dtype=np.float64)[:, None]
+            + 2 * (1 - t) * t * np.asarray(p1, dtype=np.float64)[:, None]
+            + t * t * np.asarray(p2, dtype=np.float64)[:, None])
+
+# -------------------------------
+# Real roots of a batch of quadratics k2 t^2 + k1 t + k0, shape (N, 2),
+# NaN where there is none.
+# -------------------------------
+def _quadratic_roots(k2, k1, k0):
+    roots = np.full((len(k0), 2), np.nan)
+    linear = np.abs(k2) < 1e-12
+    with np.errstate(divide="ignore", invalid="ignore"):
+        disc = k1 * k1 - 4 * k2 * k0
+        # A double root (tangent) can come out slightly negative.
+        disc = np.where((disc < 0) & (disc > -1e-12 * k1 * k1), 0.0, disc)
+        sq = np.sqrt(np.where(disc >= 0, disc, np.nan))
+        # Numerically stable pair: q = -(k1 + sign(k1) sqrt(disc)) / 2.
+        q = -0.5 * (k1 + np.copysign(sq, k1))
+        roots[:, 0] = np.where(linear, -k0 / k1, q / k2)
+        roots[:, 1] = np.where(linear, np.nan, k0 / q)
+    return roots
+
+# -------------------------------
+# Real roots of a batch of quartics k4 t^4 + ... + k0, shape (N, 4), NaN
+# where there is none. The roots are the eigenvalues of the
+# companion matrices (one batched np.linalg.eigvals call), polished with
+# two Newton steps. Rows whose t^4 and t^3 terms vanish (straight
+# trajectories) are solved as quadratics.
+# -------------------------------
+def _quartic_roots(k4, k3, k2, k1, k0):
+    roots = np.full((len(k0), 4), np.nan)
+    quartic = np.abs(k4) > 1e-12
+    if quartic.any():
+        lead = k4[quartic]
+        companion = np.zeros((len(lead), 4, 4))
+        companion[:, 0, 0] = -k3[quartic] / lead
+        companion[:, 0, 1] = -k2[quartic] / lead
+        companion[:, 0, 2] = -k1[quartic] / lead
+        companion[:, 0, 3] = -k0[quartic] / lead
+        companion[:, 1, 0] = companion[:, 2, 1] = companion[:, 3, 2] = 1.0
+        eig = np.linalg.eigvals(companion)
+        t = np.where(np.abs(eig.imag) < 1e-6, eig.real, np.nan)
+        k = [c[quartic][:, None] for c in (k4, k3, k2, k1, k0)]
+        for _ in range(2):
+            f = (((k[0] * t + k[1]) * t + k[2]) * t + k[3]) * t + k[4]
+            df = ((4 * k[0] * t + 3 * k[1]) * t + 2 * k[2]) * t + k[3]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                step = np.where(np.abs(df) > 1e-12, f / df, 0.0)
+            t = t - step
+        roots[quartic] = t
+    straight = ~quartic
+    if straight.any():
+        roots[straight, :2] = _quadratic_roots(k2[straight], k1[straight], k0[straight])
+    return roots
+
+# -------------------------------
+# Exact dome entry and exit of N quadratic Béziers.
+# |B(t)|^2 = R^2 is a quartic in t and, for the hemisphere, B_y(t) = 0 a
+# quadratic; between consecutive roots a curve is either inside or outside,
+# so one midpoint test per stretch classifies it. Returns (t_entry, t_exit)
+# of each curve's first stretch inside the dome, NaN for curves that miss
+# it; a curve that starts inside has t_entry = 0.
+# -------------------------------
+def dome_crossings(p0, p1, p2, radius, hemisphere=True):
+    # Work on the unit sphere so the thresholds above are scale free.
+    p0 = np.asarray(p0, dtype=np.float64) / radius
+    p1 = np.asarray(p1, dtype=np.float64) / radius
+    p2 = np.asarray(p2, dtype=np.float64) / radius
+    c = p0
+    b = 2 * (p1 - p0)
+    a = p0 - 2 * p1 + p2
+    dot = lambda u, v: np.einsum("ij,ij->i", u, v)
+    roots = [_quartic_roots(dot(a, a), 2 * dot(a, b), dot(b, b) + 2 * dot(a, c),
+                            2 * dot(b, c), dot(c, c) - 1.0)]
+    if hemisphere:
+        roots.append(_quadratic_roots(a[:, 1], b[:, 1], c[:, 1]))
+    n = len(c)
+    ends = np.tile([0.0, 1.0], (n, 1))
+    cuts = np.concatenate([ends] + roots, axis=1)
+    cuts[(cuts < -1e-9) | (cuts > 1 + 1e-9)] = np.nan
+    cuts = np.sort(np.clip(cuts, 0.0, 1.0), axis=1)
+
+    # Classify each stretch between consecutive cuts by its midpoint.
+    lo, hi = cuts[:, :-1], cuts[:, 1:]
+    real = ~np.isnan(hi)
+    mid = np.where(real, (lo + hi) / 2, 0.0)
+    point = bezier_points_at(p0, p1, p2, mid)
+    inside = real & (np.einsum("...i,...i->...", point, point) <= 1.0)
+    if hemisphere:
+        inside &= point[..., 1] >= 0
+    # A polished double root is only good to about 1e-8, so shorter
+    # stretches count as zero length.
+    solid = real & (hi - lo > 1e-6)
+
+    # First stretch inside, extended over zero-length stretches (double roots).
+    hit = inside & solid
+    found = hit.any(axis=1)
+    first = np.argmax(hit, axis=1)
+    after = np.arange(lo.shape[1])[None, :] > first[:, None]
+    leave = after & ((solid & ~inside) | ~real)
+    last = np.where(leave.any(axis=1), np.argmax(leave, axis=1), lo.shape[1])
+    rows = np.arange(n)
+    t_entry = np.where(found, lo[rows, first], np.nan)
+    t_exit = np.where(found, cuts[rows, last], np.nan)
+    return t_entry, t_exit
+
+# -------------------------------
+# The current modelview-projection matrix (for row vectors, as GL returns
+# it) and half the viewport size, for projecting points to window pixels.
+# -------------------------------
+def screen_transform():
+    modelview = np.array(glGetFloatv(GL_MODELVIEW_MATRIX), dtype=np.float64).reshape(4, 4)
+    projection = np.array(glGetFloatv(GL_PROJECTION_MATRIX), dtype=np.float64).reshape(4, 4)
+    viewport = np.array(glGetIntegerv(GL_VIEWPORT), dtype=np.float64)
+    return modelview @ projection, viewport[2:] / 2
+
+# -------------------------------
+# Camera position and lens scale of a screen_transform(), in the frame of
+# the curves: a short segment of length l at distance d in front of the
+# camera is about l * scale / d pixels long on screen.
+# -------------------------------
+def view_scale(transform):
+    matrix, half_viewport = transform
+    # The camera is the point whose clip x, y and w all vanish.
+    columns = matrix[:, [0, 1, 3]]
+    eye = np.linalg.solve(columns[:3].T, -columns[3])
+    scale = np.linalg.norm(matrix[:3, :2] * half_viewport, 2) / np.linalg.norm(matrix[:3, 3])
+    return eye, scale
+
+# -------------------------------
+# Zoom level of a screen_transform(): the camera's distance from the
+# origin and the lens scale, each quantized to ZOOM_STEPS buckets per
+# doubling. Orbiting the camera keeps the bucket; zooming in or out by
+# about 19% moves to the next one.
+# -------------------------------
+ZOOM_STEPS = 4
+
+def zoom_bucket(transform):
+    eye, scale = view_scale(transform)
+    distance = max(float(np.linalg.norm(eye)), 1e-6)
+    return (int(math.floor(ZOOM_STEPS * math.log2(distance))),
+            int(math.ceil(ZOOM_STEPS * math.log2(max(scale, 1e-6)))))
+
+# -------------------------------
+# Start and end parameters (N*3,) of the pieces of N curves before, inside
+# and after their dome stretch [t_entry, t_exit] (NaN: no stretch).
+# -------------------------------
+def _pieces(t_entry, t_exit):
+    n = len(t_entry)
+    entry = np.where(np.isnan(t_entry), 1.0, t_entry)
+    exit = np.where(np.isnan(t_exit), 1.0, t_exit)
+    return (np.stack([np.zeros(n), entry, exit], axis=1).ravel(),
+            np.stack([entry, exit, np.ones(n)], axis=1).ravel())
+
+# -------------------------------
+# Segment counts (N*3,) for the pieces of N quadratic Béziers at a
+# zoom_bucket(). A piece [a, b] is itself a quadratic Bézier whose control
+# points have the second difference (b - a)^2 * (p0 - 2 p1 + p2), and
+# ceil(sqrt(d / (4 * tolerance))) uniform segments keep the polyline
+# within `tolerance` of a curve with second difference d (Wang's formula).
+# d is taken in window pixels at the nearest the curve can come to a
+# camera at the bucket's distance, whatever the view direction; curves
+# within reach of the camera count as near_fraction of that distance
+# away. Zero-length pieces get no segments.
+# -------------------------------
+def segment_counts(p0, p1, p2, t_entry, t_exit, zoom, tolerance=0.25, max_segments=64,
+                   near_fraction=0.25):
+    p0 = np.asarray(p0, dtype=np.float64)
+    p1 = np.asarray(p1, dtype=np.float64)
+    p2 = np.asarray(p2, dtype=np.float64)
+    # Lower edge of the distance bucket, upper edge of the scale bucket.
+    distance = 2.0 ** (zoom[0] / ZOOM_STEPS)
+    scale = 2.0 ** (zoom[1] / ZOOM_STEPS)
+    reach = np.linalg.norm(np.stack([p0, p1, p2], axis=1), axis=2).max(axis=1)
+    near = np.maximum(distance - reach, near_fraction * distance)
+    bend = np.linalg.norm(p0 - 2 * p1 + p2, axis=1) * scale / near
+    a, b = _pieces(t_entry, t_exit)
+    deviation = np.repeat(bend, 3) * (b - a) ** 2
+    segments = np.clip(np.ceil(np.sqrt(deviation / (4 * tolerance))), 1, max_segments).astype(np.intp)
+    segments[b - a <= 1e-9] = 0
+    return segments
+
+# -------------------------------
+# Line strips for N quadratic Béziers cut into their pieces (_pieces) with
+# the given segment counts. Each non-empty piece emits its own end
+# vertices, so at the entry and exit the strip repeats the vertex with
+# the other colour.
+# Returns float32 vertices (M, 3), the inside mask (M,), int32 first and
+# counts (N,) for glMultiDrawArrays, and the parameter of every vertex.
+# -------------------------------
+def tessellate_pieces(p0, p1, p2, t_entry, t_exit, segments):
+    n = len(p0)
+    a, b = _pieces(t_entry, t_exit)
+    # Ragged parameters: piece k contributes segments[k] + 1 vertices.
+    piece_counts = np.where(segments > 0, segments + 1, 0)
+    piece = np.repeat(np.arange(len(a)), piece_counts)
+    step = np.arange(len(piece)) - np.repeat(np.cumsum(piece_counts) - piece_counts, piece_counts)
+    t = a[piece] + (b - a)[piece] * step / segments[piece]
+    curve = piece // 3
+    vertices = bezier_at(p0[curve], p1[curve], p2[curve], t).astype(np.float32)
+    counts = piece_counts.reshape(n, 3).sum(axis=1).astype(np.int32)
+    first = (np.cumsum(counts) - counts).astype(np.int32)
+    return vertices, piece % 3 == 1, first, counts, t
+
+# -------------------------------
+# Centres of a count x count grid of dots on the inscribed square of side
+# `side`, as (count*count, 3) points on the base plane. Row-major in i (x)
+# then j (z), the order of the scripts' nested loops.
+# -------------------------------
+def dot_grid(side, count):
+    coords = -side / 2 + (np.arange(count) + 0.5) * (side / count)
+    x, z = np.meshgrid(coords, coords, indexing="ij")
+    points = np.zeros((count * count, 3), dtype=np.float32)
+    points[:, 0] = x.ravel()
+    points[:, 2] = z.ravel()
+    return points
+
+# -------------------------------
+# Persistent trajectories for a grid of dots.
+# Every dot gets one seeded random number u in [0, 1) when the grid is
+# created; build(p_end, u, radius, *params) turns dot positions and those
+# numbers into (launch, control) points, so a dot keeps its trajectory from
+# frame to frame. Control points and the exact dome entry and exit
+# parameters (dome_crossings) are kept between frames. When the dots, the
+# radius or params change, all entries are marked stale, but only the ones
+# being drawn are rebuilt. With `sample`, only that many of the valid dots
+# are drawn, re-chosen every reselect_interval seconds (or on reselect()
+# when the interval is None) instead of every frame.
+#
+# tessellate() turns the selected trajectories into adaptive strips for
+# the current zoom_bucket(). The strips are kept until the trajectories
+# or the bucket change, so orbiting the camera and animating t_end reuse
+# them.
+# -------------------------------
+class TrajectoryStore:
+    def __init__(self, build, sample=None, reselect_interval=5.0, seed=None):
+        self.build = build
+        self.sample = sample
+        self.reselect_interval = reselect_interval
+        self.rng = np.random.default_rng(seed)
+        self.dots = None
+        self.params = None
+        self.seeds = np.empty(0)
+        self.selected = np.empty(0, dtype=np.intp)
+        self.selected_at = None
+        self.generation = 0
+        self.strips_key = None
+
+        # Counters for the store statistics.
+        self.rebuilt = 0
+        self.invalidations = 0
+        self.reselections = 0
+        self.tessellations = 0
+
+    def _allocate(self, count):
+        self.seeds = self.rng.random(count)
+        self.controls = np.zeros((count, 3, 3))
+        self.entry = np.full(count, np.nan)
+        self.exit = np.full(count, np.nan)
+        self.stale = np.ones(count, dtype=bool)
+        self.selected = np.empty(0, dtype=np.intp)
+        self.selected_at = None
+
+    def _select(self, valid):
+        if self.sample is None or len(valid) <= self.sample:
+            if not np.array_equal(self.selected, valid):
+                self.selected = valid
+                self.generation += 1
+            return
+        now = time.perf_counter()
+        due = self.selected_at is None or (self.reselect_interval is not None and
+                                           now - self.selected_at >= self.reselect_interval)
+        if due or len(self.selected) != self.sample or not np.isin(self.selected, valid).all():
+            self.selected = np.sort(self.rng.choice(valid, self.sample, replace=False))
+            self.selected_at = now
+            self.reselections += 1
+            self.generation += 1
+
+    def reselect(self):
+        self.selected_at = None
+
+    # -------------------------------
+    # Bring the selected trajectories up to date for the dome radius and
+    # params. `dots` are the (N, 3) end points and `valid` an optional mask
+    # of the dots that may be drawn; params are passed through to build().
+    # -------------------------------
+    def update(self, dots, valid, radius, *params):
+        params = (radius,) + params
+        if len(dots) != len(self.seeds):
+            self._allocate(len(dots))
+        elif params != self.params or not np.array_equal(dots, self.dots):
+            self.stale[:] = True
+            self.invalidations += 1
+        self.dots = dots
+        self.params = params
+        self._select(np.arange(len(dots)) if valid is None else np.flatnonzero(valid))
+        rebuild = self.selected[self.stale[self.selected]]
+        if len(rebuild):
+            p_end = dots[rebuild]
+            p0, p_control = self.build(p_end, self.seeds[rebuild], *params)
+            self.controls[rebuild] = np.stack([p0, p_control, p_end], axis=1)
+            self.entry[rebuild], self.exit[rebuild] = dome_crossings(p0, p_control, p_end, radius)
+            self.stale[rebuild] = False
+            self.rebuilt += len(rebuild)
+            self.generation += 1
+
+    # -------------------------------
+    # Adaptive strips of the selected trajectories (vertices, inside,
+    # first, counts), drawn up to t_end.
+    # -------------------------------
+    def tessellate(self, transform, tolerance=0.25, t_end=None):
+        key = (self.generation, zoom_bucket(transform), tolerance)
+        if key != self.strips_key:
+            controls = self.controls[self.selected]
+            entry, exit = self.entry[self.selected], self.exit[self.selected]
+            segments = segment_counts(controls[:, 0], controls[:, 1], controls[:, 2],
+                                      entry, exit, key[1], tolerance)
+            self.strips = tessellate_pieces(controls[:, 0], controls[:, 1], controls[:, 2],
+                                            entry, exit, segments)
+            self.strips_key = key
+            self.tessellations += 1
+        vertices, inside, first, counts, t = self.strips
+        if t_end is None or t_end >= 1.0 or len(counts) == 0:
+            return vertices, inside, first, counts
+        # Cut every strip after its last vertex at or before t_end and
+        # put the curve point at t_end in the next vertex's place.
+        kept = np.add.reduceat((t <= t_end).astype(np.int32), first)
+        cut = np.flatnonzero(kept < counts)
+        vertices = vertices.copy()
+        controls = self.controls[self.selected[cut]]
+        vertices[first[cut] + kept[cut]] = bezier_at(controls[:, 0], controls[:, 1], controls[:, 2],
+                                                     np.full(len(cut), t_end))
+        counts = counts.copy()
+        counts[cut] = kept[cut] + 1
+        return vertices, inside, first, counts
+
+    def end_points(self):
+        return self.dots[self.selected]
+
+    def stats(self):
+        return {
+            "entries": len(self.seeds),
+            "selected": len(self.selected),
+            "rebuilt": self.rebuilt,
+            "invalidations": self.invalidations,
+            "reselections": self.reselections,
+            "tessellations": self.tessellations,
+        }
+
+# -------------------------------
+# Bounded history of points for the multi-camera dome (hits, tracks and
+# trajectory lines). Rows of `width` points (1 for hit points, 2 for line
+# segments) live in a preallocated NumPy ring of `capacity` rows; when it
+# is full, new rows overwrite the oldest. Rows older than max_age seconds
+# are dropped, and over the last `fade` seconds of their life they fade
+# out. draw() sends the live rows with one draw call in `mode`.
+# -------------------------------
+class PointRing:
+    def __init__(self, capacity, colour, width=1, mode=GL_POINTS, max_age=None, fade=None):
+        self.capacity = capacity
+        self.colour = colour
+        self.width = width
+        self.mode = mode
+        self.max_age = max_age
+        self.fade = fade if fade is not None else (max_age / 4 if max_age else None)
+        self.points = np.zeros((capacity, width, 3), dtype=np.float32)
+        self.born = np.zeros(capacity)
+        self.head = 0   # Next row to write
+        self.size = 0   # Live rows, ending just before head
+
+        # Counters for the ring statistics.
+        self.appended = 0
+        self.overwritten = 0
+        self.expired = 0
+
+    # -------------------------------
+    # Append rows of points, shape (k, 3) for width 1 or (k, width, 3).
+    # -------------------------------
+    def append(self, points, now=None):
+        rows = np.asarray(points, dtype=np.float32).reshape(-1, self.width, 3)
+        n = len(rows)
+        if n == 0:
+            return
+        # Rows beyond the capacity would be overwritten within this call.
+        rows = rows[-self.capacity:]
+        now = time.perf_counter() if now is None else now
+        index = (self.head + np.arange(len(rows))) % self.capacity
+        self.points[index] = rows
+        self.born[index] = now
+        self.head = (self.head + len(rows)) % self.capacity
+        self.overwritten += max(0, self.size + n - self.capacity)
+        self.size = min(self.size + n, self.capacity)
+        self.appended += n
+
+    # Live row indices, oldest first.
+    def _live(self):
+        return (self.head - self.size + np.arange(self.size)) % self.capacity
+
+    def _expire(self, now):
+        if self.max_age is None or self.size == 0:
+            return
+        # Rows are appended in time order, so the expired ones are the oldest.
+        old = int(np.count_nonzero(self.born[self._live()] < now - self.max_age))
+        self.size -= old
+        self.expired += old
+
+    def __len__(self):
+        return self.size
+
+    # -------------------------------
+    # Draw the live rows. The ring is at most two runs of rows, drawn
+    # together with glMultiDrawArrays.
+    # -------------------------------
+    def draw(self, now=None):
+        now = time.perf_counter() if now is None else now
+        self._expire(now)
+        if self.size == 0:
+            return
+        start = (self.head - self.size) % self.capacity
+        end = start + self.size
+        runs = [(start, min(end, self.capacity))]
+        if end > self.capacity:
+            runs.append((0, end - self.capacity))
+        first = np.array([a * self.width for a, _ in runs], dtype=np.int32)
+        counts = np.array([(b - a) * self.width for a, b in runs], dtype=np.int32)
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, self.points)
+        fading = self.fade is not None
+        if fading:
+            alpha = np.clip((self.max_age - (now - self.born)) / self.fade, 0.0, 1.0)
+            colours = np.empty((self.capacity, self.width, 4), dtype=np.float32)
+            colours[..., :3] = self.colour
+            colours[..., 3] = alpha[:, None]
+            glPushAttrib(GL_COLOR_BUFFER_BIT)
+            glEnable(GL_BLEND)
+            glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+            glEnableClientState(GL_COLOR_ARRAY)
+            glColorPointer(4, GL_FLOAT, 0, colours)
+        else:
+            glColor3f(*self.colour)
+        glMultiDrawArrays(self.mode, first, counts, len(runs))
+        if fading:
+            glDisableClientState(GL_COLOR_ARRAY)
+            glPopAttrib()
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+    def stats(self):
+        return {
+            "live": self.size,
+            "capacity": self.capacity,
+            "appended": self.appended,
+            "overwritten": self.overwritten,
+            "expired": self.expired,
+        }
+
+# -------------------------------
+# Draws trajectory batches from client-side vertex and colour arrays.
+# -------------------------------
+class TrajectoryBatch:
+    def __init__(self, outside_colour=TRAJECTORY_OUTSIDE_COLOUR):
+        self.outside_colour = outside_colour
+        self.curves_drawn = 0
+        self.vertices_drawn = 0
+        self.draw_calls = 0
+
+    # -------------------------------
+    # Outside and inside colour packed as RGBA bytes in one uint32 each,
+    # so the per-vertex colours are a single np.take over the mask.
+    # -------------------------------
+    def _palette(self, inside_colour):
+        rgba = np.full((2, 4), 255, dtype=np.uint8)
+        rgba[:, :3] = np.round(np.array([self.outside_colour, inside_colour]) * 255)
+        return rgba.view(np.uint32).ravel()
+
+    # -------------------------------
+    # Draw a ragged batch of line strips: vertices (M, 3), inside mask (M,),
+    # and each strip's first vertex and vertex count.
+    # -------------------------------
+    def draw_strips(self, vertices, inside, first, counts, inside_colour):
+        if len(counts) == 0:
+            return
+        vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        colours = np.take(self._palette(inside_colour), inside.view(np.uint8))
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, vertices)
+        glColorPointer(4, GL_UNSIGNED_BYTE, 0, colours.view(np.uint8))
+        glMultiDrawArrays(GL_LINE_STRIP, first, counts, len(counts))
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        self.curves_drawn += len(counts)
+        self.vertices_drawn += int(counts.sum())
+        self.draw_calls += 1
+
+    # -------------------------------
+    # Line segments (pairs of rows) or points in the current colour.
+    # -------------------------------
+    def draw_lines(self, vertices):
+        self._draw_plain(GL_LINES, vertices)
+
+    def draw_points(self, vertices):
+        self._draw_plain(GL_POINTS, vertices)
+
+    def _draw_plain(self, mode, vertices):
+        if len(vertices) == 0:
+            return
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, np.ascontiguousarray(vertices, dtype=np.float32))
+        glDrawArrays(mode, 0, len(vertices))
+        glDisableClientState(GL_VERTEX_ARRAY)
+        self.draw_calls += 1
+
+    def stats(self):
+        return {
+            "curves_drawn": self.curves_drawn,
+            "vertices_drawn": self.vertices_drawn,
+            "draw_calls": self.draw_calls,
+        }
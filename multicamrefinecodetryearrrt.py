@@ -7,6 +7,15 @@ from OpenGL.GLU import *
 import math
 import os
 import random
+from dome_capture import (ClipCache, LatestFrameReader, SourceOpener, StartupTimeline,
+                          VideoDecodePool)
+from dome_sources import open_recorder
+from dome_texture import FeedCache
+from dome_trajectories import PointRing, bezier_at, bezier_points, crossing_mask, dome_crossings
+
+# Milestones from process start to the first live camera frame on screen.
+startup = StartupTimeline()
+startup.mark("imports")
 
 # -------------------------------
 # Global parameters
@@ -16,75 +25,94 @@ video_folder = "/home/sakthees/Videos/chola-domepython/videos"
 # Specify the video filenames you expect in the folder:
 video_files = ["tree.mp4", "free.mp4", "sree.mp4", "extra.mp4"]
 speed_factor = 0.5
+decode_workers = 4     # Video decode processes
+decode_ring_depth = 4  # Frames buffered per video in shared memory
+clip_cache_mb = 512    # Clips that fit are decoded once and looped from RAM
+clip_size = (640, 480) # Larger clips are downscaled to the on-dome texture size
 
 # Camera parameters
 zoom_factor = 1.0
 camera_yaw = 0.0
 camera_pitch = 0.0
 
-# Trajectory data
-trajectories = []    # List of (start_point, end_point) tuples for drawn trajectory lines
-dome_hits = []       # Permanent red hit points on the dome when the trajectory first enters
-inside_tracks = []   # Yellow locus for the portion of the trajectory inside the dome
-base_hits = []       # Red points on the base circle of the dome
+# Trajectory data, in bounded rings that fade out and drop old entries
+trajectory_capacity = 500    # Trajectories kept; older ones are overwritten
+trajectory_max_age = 60.0    # Seconds before a trajectory fades out (None keeps them)
+track_points = 50            # Samples per trajectory, at most that many inside the dome
+trajectories = PointRing(trajectory_capacity, (1, 0, 0), width=2, mode=GL_LINES,
+                         max_age=trajectory_max_age)   # Start-to-end trajectory lines
+dome_hits = PointRing(trajectory_capacity, (1, 0, 0), max_age=trajectory_max_age)      # Red hit points on the dome where the trajectory first enters
+inside_tracks = PointRing(trajectory_capacity * track_points, (1, 1, 0),
+                          max_age=trajectory_max_age)  # Yellow locus for the portion of the trajectory inside the dome
+base_hits = PointRing(trajectory_capacity, (1, 0, 0), max_age=trajectory_max_age)      # Red points on the base circle of the dome
 
 # -------------------------------
-# Check video files and open them
+# Check video files and open them.
+# DOME_VIDEOS (comma-separated) and DOME_CAMERA swap the videos and the webcam
+# for other frame sources, see dome_sources.open_source. Anything that fails
+# to open is reported by main() rather than exiting at import.
 # -------------------------------
+startup_errors = []
 valid_video_paths = []
-for vid in video_files:
-    path = os.path.join(video_folder, vid)
-    if not os.path.exists(path):
-        print(f"Error: File does not exist: {path}")
-    else:
-        valid_video_paths.append(path)
+if os.environ.get("DOME_VIDEOS"):
+    valid_video_paths = os.environ["DOME_VIDEOS"].split(",")
+else:
+    for vid in video_files:
+        path = os.path.join(video_folder, vid)
+        if not os.path.exists(path):
+            print(f"Error: File does not exist: {path}")
+        else:
+            valid_video_paths.append(path)
 
 if not valid_video_paths:
-    print("No valid video files found! Exiting.")
-    exit()
+    startup_errors.append("No valid video files found! Exiting.")
 
 # -------------------------------
-# Initialize webcam
+# Start the video decoders.
+# Short clips are cached in RAM, the others are decoded in worker processes
+# into shared-memory rings. The pool is created before the webcam opens so
+# the workers are forked first.
 # -------------------------------
-cap_webcam = cv2.VideoCapture(0)
-if not cap_webcam.isOpened():
-    print("Error: Could not open webcam")
-    exit()
-
-# -------------------------------
-# Open valid video files using OpenCV
-# -------------------------------
-caps_videos = []
+clip_cache = ClipCache(budget_mb=clip_cache_mb, size=clip_size)
+video_pool = VideoDecodePool(valid_video_paths, ring_depth=decode_ring_depth,
+                             workers=decode_workers, clip_cache=clip_cache,
+                             timeline=startup)
 for path in valid_video_paths:
-    cap = cv2.VideoCapture(path)
-    if not cap.isOpened():
-        print(f"Error: Could not open video: {path}")
-        exit()
+    if path in video_pool.failed:
+        startup_errors.append(f"Error: Could not open video: {path}")
     else:
         print(f"Opened video: {path}")
-        caps_videos.append(cap)
 
-# Generate texture IDs
-texture_webcam = glGenTextures(1)
-texture_videos = glGenTextures(len(caps_videos))
+# -------------------------------
+# Initialize webcam
+# -------------------------------
+# The webcam opens in the background; its part of the dome is skipped
+# until the first frame arrives, and stays empty if the webcam fails.
+cap_webcam = SourceOpener(os.environ.get("DOME_CAMERA", "device:0"), name="webcam",
+                          timeline=startup)
+# The webcam is read on its own thread; the renderer only takes the newest frame.
+# DOME_RECORD=session.npy also records the raw webcam frames for replay.
+webcam_recorder = open_recorder(os.environ.get("DOME_RECORD"))
+feed_webcam = LatestFrameReader(cap_webcam, name="webcam", recorder=webcam_recorder,
+                                timeline=startup)
+
+# Every feed is read and uploaded once per render tick; the dome only binds.
+feeds = FeedCache()
 
 # -------------------------------
-# Function to load a frame into a texture
+# Take the newest webcam frame from the capture thread.
+# Returns None until the first frame has arrived.
 # -------------------------------
-def load_texture(cap, texture_id):
-    ret, frame = cap.read()
-    if not ret:
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Restart video if it ends
-        ret, frame = cap.read()
-    frame = cv2.flip(frame, 0)
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    frame_data = frame.tobytes()
-    glBindTexture(GL_TEXTURE_2D, texture_id)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, frame.shape[1], frame.shape[0],
-                 0, GL_RGB, GL_UNSIGNED_BYTE, frame_data)
-    return True
+def read_webcam():
+    captured = feed_webcam.latest()
+    if captured is None:
+        return None
+    return captured.image, captured.seq
+
+feeds.add("webcam", read_webcam)
+# Videos show the placeholder pattern while their clips are still loading.
+for idx in range(video_pool.count):
+    feeds.add("video%d" % idx, lambda idx=idx: video_pool.read(idx), placeholder=True)
 
 # -------------------------------
 # Draw Dome with Webcam and Video Feeds
@@ -95,8 +123,7 @@ def draw_textured_dome():
     glDisable(GL_CULL_FACE)  # Disable face culling so both sides are visible
     
     # Draw front patch using webcam texture (first quarter of slices)
-    if load_texture(cap_webcam, texture_webcam):
-        glBindTexture(GL_TEXTURE_2D, texture_webcam)
+    if feeds.bind("webcam"):
         glBegin(GL_QUADS)
         for i in range(stacks):
             theta0 = (i / stacks) * (math.pi / 2)
@@ -114,11 +141,11 @@ def draw_textured_dome():
                 glTexCoord2f(j / slices, (i + 1) / stacks)
                 glVertex3f(x1, y1, z1)
         glEnd()
+        feeds.unbind("webcam")
     
     # Draw remaining dome sections using video textures
-    for idx, cap in enumerate(caps_videos):
-        if load_texture(cap, texture_videos[idx]):
-            glBindTexture(GL_TEXTURE_2D, texture_videos[idx])
+    for idx in range(video_pool.count):
+        if feeds.bind("video%d" % idx):
             glBegin(GL_QUADS)
             for i in range(stacks):
                 theta0 = (i / stacks) * (math.pi / 2)
@@ -136,31 +163,19 @@ def draw_textured_dome():
                     glTexCoord2f(j / slices, (i + 1) / stacks)
                     glVertex3f(x1, y1, z1)
             glEnd()
+            feeds.unbind("video%d" % idx)
     glDisable(GL_TEXTURE_2D)
 
 # -------------------------------
-# Draw Trajectories and Hit Points
+# Draw Trajectories and Hit Points (one array draw per ring)
 # -------------------------------
 def draw_trajectories():
-    glColor3f(1, 0, 0)
-    glBegin(GL_LINES)
-    for traj in trajectories:
-        glVertex3fv(traj[0])
-        glVertex3fv(traj[1])
-    glEnd()
+    trajectories.draw()
     
     glPointSize(6)
-    glBegin(GL_POINTS)
-    for hit in dome_hits:
-        glColor3f(1, 0, 0)
-        glVertex3fv(hit)
-    for track in inside_tracks:
-        glColor3f(1, 1, 0)
-        glVertex3fv(track)
-    for base in base_hits:
-        glColor3f(1, 0, 0)
-        glVertex3fv(base)
-    glEnd()
+    dome_hits.draw()
+    inside_tracks.draw()
+    base_hits.draw()
 
 # -------------------------------
 # Generate a Parabolic Trajectory Toward the Dome
@@ -182,33 +197,39 @@ def generate_parabolic_trajectory():
     control_z = (start_z + end_z) / 2
     control_y = random.uniform(dome_radius / 2, dome_radius)  # High arch
 
-    points = []
-    num_segments = 50
-    entered_dome = False
-    for t in np.linspace(0, 1, num_segments):
-        bx = (1 - t) ** 2 * start_x + 2 * (1 - t) * t * control_x + t ** 2 * end_x
-        by = (1 - t) ** 2 * start_y + 2 * (1 - t) * t * control_y + t ** 2 * end_y
-        bz = (1 - t) ** 2 * start_z + 2 * (1 - t) * t * control_z + t ** 2 * end_z
-        points.append((bx, by, bz))
-        
-        r = math.sqrt(bx**2 + bz**2)
-        if not entered_dome and r <= dome_radius:
-            dome_hits.append((bx, by, bz))
-            entered_dome = True
-        if r <= dome_radius:
-            inside_tracks.append((bx, by, bz))
+    start = np.array([[start_x, start_y, start_z]])
+    control = np.array([[control_x, control_y, control_z]])
+    end = np.array([[end_x, end_y, end_z]])
+    points = bezier_points(start, control, end, track_points - 1)[0]
+    
+    # Exact entry into (and exit from) the dome hemisphere; the hit point
+    # lies on the dome surface and the track covers the stretch inside.
+    t_entry, t_exit = dome_crossings(start, control, end, dome_radius)
+    if not np.isnan(t_entry[0]):
+        dome_hits.append(bezier_at(start, control, end, t_entry))
+        inside = crossing_mask(t_entry, t_exit, track_points - 1)[0]
+        inside_tracks.append(points[inside])
     
-    base_hits.append(points[-1])
-    trajectories.append((points[0], points[-1]))
+    base_hits.append(points[-1:])
+    trajectories.append(points[[0, -1]])
 
 # -------------------------------
 # Main Loop with Camera Controls (Arrow keys rotate; +/- zoom; Ctrl+Left click for continuous zoom in)
 # -------------------------------
 def main():
     global camera_yaw, camera_pitch, zoom_factor
+    if startup_errors:
+        for error in startup_errors:
+            print(error)
+        feed_webcam.stop()
+        video_pool.close()
+        clip_cache.close()
+        return
     pygame.init()
     screen = pygame.display.set_mode((800, 600), DOUBLEBUF | OPENGL)
+    startup.mark("GL context")
     pygame.display.set_caption("Dome Projection with Videos & Webcam")
+    feed_webcam.start()
     glEnable(GL_DEPTH_TEST)
     glDisable(GL_CULL_FACE)
     glMatrixMode(GL_PROJECTION)
@@ -253,15 +274,26 @@ def main():
         cam_z = distance * math.cos(camera_yaw) * math.cos(camera_pitch)
         gluLookAt(cam_x, cam_y, cam_z, 0, dome_radius/2, 0, 0, 1, 0)
         
+        # Advance every feed exactly once for this frame.
+        feeds.advance()
         draw_textured_dome()
         draw_trajectories()
         
         pygame.display.flip()
+        feed_webcam.frame_presented()
+        if feeds.ready["webcam"] and startup.mark("first live texture"):
+            startup.report()
         clock.tick(30)
     
+    print("Feed decodes per tick:", feeds.stats())
+    print("Video decode pool:", video_pool.stats())
+    print("Clip cache:", clip_cache.stats())
+    print("Trajectory rings:", {"trajectories": trajectories.stats(), "dome_hits": dome_hits.stats(),
+                                "inside_tracks": inside_tracks.stats(), "base_hits": base_hits.stats()})
+    feed_webcam.stop()
     cap_webcam.release()
-    for cap in caps_videos:
-        cap.release()
+    video_pool.close()  # Stops the workers and releases every capture
+    clip_cache.close()
     pygame.quit()
 
 if __name__ == "__main__":
@@ -5,15 +5,46 @@ from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import math
-import random
+import os
+from dome_capture import FrameStages, LatestFrameReader, SourceOpener, StartupTimeline, feed_footprint
+from dome_mesh import DomeLOD, DomeScenery
+from dome_redraw import RedrawScheduler
+from dome_sources import open_recorder
+from dome_texture import TextureStream
+from dome_trajectories import TrajectoryBatch, TrajectoryStore, dot_grid, screen_transform
+
+# Milestones from process start to the first live camera frame on screen.
+startup = StartupTimeline()
+startup.mark("imports")
 
 # Window dimensions
 window_width = 800
 window_height = 600
 
-# Initialize video capture (webcam)
-cap = cv2.VideoCapture(0)
+# Initialize video capture (webcam). It opens in the background, so the window
+# comes up at once and shows a placeholder until the first frame arrives.
+# DOME_CAMERA picks another frame source, e.g. "synthetic" or "replay:session.npy".
+camera_source = os.environ.get("DOME_CAMERA", "device:0")
+cap = SourceOpener(camera_source, name="webcam", timeline=startup)
+# DOME_RECORD=session.npy also records the raw frames for replay.
+camera_recorder = open_recorder(os.environ.get("DOME_RECORD"))
+feed = LatestFrameReader(cap, name="webcam", recorder=camera_recorder, timeline=startup)  # Capture thread; the render loop never calls cap.read()
 texture_id = None  # Global texture id for webcam feed
+feed_texture = TextureStream(mipmaps=True)  # Allocated once, updated with glTexSubImage2D
+adaptive_feed_resolution = True  # Downscale webcam frames to their on-screen size
+# DOME_TESSELLATION picks the dome mesh: "latlong" (default), "icosphere", or
+# "patches" for the old square patches, which leave the rim open.
+dome_tessellation = os.environ.get("DOME_TESSELLATION", "latlong")
+dome_lod = DomeLOD(dome_tessellation)  # Level of detail follows the camera distance
+frame_stages = FrameStages()  # Per-frame time breakdown, printed on exit
+dome_scenery = DomeScenery(stages=frame_stages)  # Base circle, spokes and apex arrays
+# DOME_DOT_GRID sets the number of dots per side of the base grid; each dot
+# gets one trajectory.
+dots_per_side = int(os.environ.get("DOME_DOT_GRID", "20"))
+# DOME_CURVE_TOLERANCE is how far (in pixels) a trajectory polyline may
+# stray from the true curve on screen.
+curve_tolerance = float(os.environ.get("DOME_CURVE_TOLERANCE", "0.25"))
+trajectory_batch = TrajectoryBatch()  # All trajectories in one glMultiDrawArrays call
 
 # Global variables for rotation and zoom
 dome_rotation = 0.0
@@ -67,21 +98,36 @@ class Slider:
 # Update the webcam texture from OpenCV
 # -------------------------------
 def load_texture():
-    global texture_id, cap
-    ret, frame = cap.read()
-    if not ret:
+    global texture_id
+    # Take the newest frame published by the capture thread.
+    captured = feed.latest()
+    if captured is None:
         return
-    # Flip vertically and convert BGR to RGB.
-    frame = cv2.flip(frame, 0)
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    frame_data = frame.tobytes()
-    if texture_id is None:
-        texture_id = glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, texture_id)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, frame.shape[1], frame.shape[0],
-                 0, GL_RGB, GL_UNSIGNED_BYTE, frame_data)
+    # Upload only when the frame is new; storage is reallocated only when the resolution changes.
+    feed_texture.update(captured.image, captured.seq)
+    texture_id = feed_texture.texture_id
+
+# -------------------------------
+# Launch and control points for the dots' trajectories.
+# Each dot's p0 is a random external starting point on the same ray but
+# outside the dome; u in [0, 1) is the dot's persistent random number.
+# -------------------------------
+def launch_points(p_end, u, dome_radius, parabola_height):
+    mag = np.hypot(p_end[:, 0], p_end[:, 2])
+    centre = mag < 1e-3
+    mag[centre] = 1.0
+    # To ensure p0 is outside, the scaling factor must be greater than (dome_radius / mag).
+    min_factor = (dome_radius / mag) * 1.05
+    max_factor = (dome_radius / mag) * 1.5
+    factor = min_factor + u * (max_factor - min_factor)
+    p0 = p_end * factor[:, None]
+    p0[centre] = (dome_radius * 1.2, 0, 0)
+    # Define control point: halfway between p0 and p_end plus an upward offset.
+    p_control = (p0 + p_end) / 2.0
+    p_control[:, 1] = parabola_height
+    return p0, p_control
+
+trajectory_store = TrajectoryStore(launch_points)  # Seeded trajectories, kept between frames
 
 # -------------------------------
 # Draw the camera feed as a quad on the ground.
@@ -106,7 +152,7 @@ def draw_camera_feed(dome_radius, parabola_range, parabola_height):
     # Draw textured quad (webcam feed)
     glEnable(GL_TEXTURE_2D)
     load_texture()
-    glBindTexture(GL_TEXTURE_2D, texture_id)
+    feed_texture.bind()  # Placeholder pattern until the first frame arrives
     glColor3f(1, 1, 1)
     glBegin(GL_QUADS)
     glTexCoord2f(0, 0); glVertex3f(-side/2, 0, -side/2)
@@ -114,84 +160,40 @@ def draw_camera_feed(dome_radius, parabola_range, parabola_height):
     glTexCoord2f(1, 1); glVertex3f(side/2, 0, side/2)
     glTexCoord2f(0, 1); glVertex3f(-side/2, 0, side/2)
     glEnd()
+    feed_texture.unbind()
     glDisable(GL_TEXTURE_2D)
     
-    # Draw a 20x20 grid of red dots over the camera feed
+    # Draw a dots_per_side x dots_per_side grid of red dots over the camera feed
     glPointSize(5)
     glColor3f(1, 0, 0)
-    glBegin(GL_POINTS)
-    for i in range(20):
-        for j in range(20):
-            dot_x = -side/2 + (i + 0.5) * (side/20)
-            dot_z = -side/2 + (j + 0.5) * (side/20)
-            glVertex3f(dot_x, 0.001, dot_z)  # slight y-offset to avoid z-fighting
-    glEnd()
+    dots = dot_grid(side, dots_per_side)
+    dots[:, 1] = 0.001  # slight y-offset to avoid z-fighting
+    trajectory_batch.draw_points(dots)
     
     # Set line width for trajectories
     glLineWidth(2)
-    num_segments = 30
     # Use time to toggle blinking for red segments.
     current_time = pygame.time.get_ticks()
     blink = (int(current_time / 200) % 2 == 0)
     
-    # For each red dot, compute a random external starting point (p0) and draw the parabolic curve.
-    for i in range(20):
-        for j in range(20):
-            # p_end is the red dot on the quad.
-            dot_x = -side/2 + (i + 0.5) * (side/20)
-            dot_z = -side/2 + (j + 0.5) * (side/20)
-            p_end = (dot_x, 0, dot_z)
-            # Compute magnitude in x-z plane.
-            mag = math.sqrt(dot_x**2 + dot_z**2)
-            # Choose a random starting point p0 on the same ray but outside the dome.
-            if mag < 1e-3:
-                p0 = (dome_radius * 1.2, 0, 0)
-            else:
-                # To ensure p0 is outside, the scaling factor must be greater than (dome_radius / mag).
-                min_factor = (dome_radius / mag) * 1.05
-                max_factor = (dome_radius / mag) * 1.5
-                factor = random.uniform(min_factor, max_factor)
-                p0 = (dot_x * factor, 0, dot_z * factor)
-            # Define control point: halfway between p0 and p_end plus an upward offset.
-            p_control = ((p0[0] + p_end[0]) / 2.0, parabola_height, (p0[2] + p_end[2]) / 2.0)
-            
-            # Draw the quadratic Bézier curve, segment by segment.
-            glBegin(GL_LINE_STRIP)
-            for k in range(num_segments + 1):
-                t = k / float(num_segments)
-                bx = (1-t)**2 * p0[0] + 2*(1-t)*t * p_control[0] + t**2 * p_end[0]
-                by = (1-t)**2 * p0[1] + 2*(1-t)*t * p_control[1] + t**2 * p_end[1]
-                bz = (1-t)**2 * p0[2] + 2*(1-t)*t * p_control[2] + t**2 * p_end[2]
-                # Check if the current point is inside the dome.
-                if bx*bx + by*by + bz*bz <= dome_radius*dome_radius:
-                    # Inside dome: use blinking red.
-                    if blink:
-                        glColor3f(1, 0, 0)
-                    else:
-                        glColor3f(0.5, 0, 0)
-                else:
-                    # Outside dome: solid green.
-                    glColor3f(0, 1, 0)
-                glVertex3f(bx, by, bz)
-            glEnd()
-            
-            # Draw a yellow line from the dome’s center (base center) to the red dot.
-            glColor3f(1, 1, 0)
-            glBegin(GL_LINES)
-            glVertex3f(0, 0, 0)
-            glVertex3f(p_end[0], p_end[1], p_end[2])
-            glEnd()
+    # Each red dot keeps its trajectory; only changed sliders rebuild them.
+    p_end = dot_grid(side, dots_per_side)
+    trajectory_store.update(p_end, None, dome_radius, parabola_height)
+    
+    # Inside the dome: blinking red; outside: solid green. The polylines
+    # follow the on-screen size of each curve and split at the dome entry.
+    strips = trajectory_store.tessellate(screen_transform(), curve_tolerance)
+    trajectory_batch.draw_strips(*strips, (1, 0, 0) if blink else (0.5, 0, 0))
+    
+    # Draw yellow lines from the dome's center (base center) to the red dots.
+    glColor3f(1, 1, 0)
+    center_lines = np.zeros((len(p_end), 2, 3), dtype=np.float32)
+    center_lines[:, 1] = p_end
+    trajectory_batch.draw_lines(center_lines.reshape(-1, 3))
     
     # Additionally, draw yellow spokes from the center to the dome's base perimeter.
     glColor3f(1, 1, 0)
-    glBegin(GL_LINES)
-    for angle in range(0, 360, 15):
-        rad = math.radians(angle)
-        x = dome_radius * math.cos(rad)
-        z = dome_radius * math.sin(rad)
-        glVertex3f(0, 0, 0)
-        glVertex3f(x, 0, z)
-    glEnd()
+    dome_scenery.draw_spokes(dome_radius)
     
     glPopMatrix()
 
@@ -200,30 +202,11 @@ def draw_camera_feed(dome_radius, parabola_range, parabola_height):
 # The dome is defined by the hemisphere: x^2 + y^2 + z^2 = R^2, y >= 0.
 # -------------------------------
 def draw_dome_square_patches(dome_radius, grid):
-    dx = (2 * dome_radius) / grid
     glEnable(GL_BLEND)
     glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
     glColor4f(0.0, 0.6, 1.0, 0.3)  # Transparent blue color
-    for i in range(grid):
-        for j in range(grid):
-            x0 = -dome_radius + i * dx
-            z0 = -dome_radius + j * dx
-            x1 = x0 + dx
-            z1 = z0 + dx
-            if (x0*x0 + z0*z0 <= dome_radius*dome_radius and
-                x1*x1 + z0*z0 <= dome_radius*dome_radius and
-                x1*x1 + z1*z1 <= dome_radius*dome_radius and
-                x0*x0 + z1*z1 <= dome_radius*dome_radius):
-                y0 = math.sqrt(dome_radius*dome_radius - x0*x0 - z0*z0)
-                y1 = math.sqrt(dome_radius*dome_radius - x1*x1 - z0*z0)
-                y2 = math.sqrt(dome_radius*dome_radius - x1*x1 - z1*z1)
-                y3 = math.sqrt(dome_radius*dome_radius - x0*x0 - z1*z1)
-                glBegin(GL_QUADS)
-                glVertex3f(x0, y0, z0)
-                glVertex3f(x1, y1, z0)
-                glVertex3f(x1, y2, z1)
-                glVertex3f(x0, y3, z1)
-                glEnd()
+    # The grid slider caps the detail: the patch grid, or the highest quality level.
+    dome_lod.draw(dome_radius, grid)
     glDisable(GL_BLEND)
 
 # -------------------------------
@@ -245,6 +228,11 @@ def render_scene(dome_radius, grid, parabola_range, parabola_height):
     gluLookAt(cam_x, cam_y, cam_z,
               0, center_y, 0,
               0, 1, 0)
+    # Match the webcam resolution to the base circle's on-screen size.
+    if adaptive_feed_resolution:
+        distance = math.sqrt(cam_x**2 + cam_y**2 + cam_z**2)
+        feed.footprint = feed_footprint(dome_radius, distance, 45, window_height)
+    dome_lod.set_view((cam_x, cam_y, cam_z), dome_rotation, 45, window_height)
 
     glPushMatrix()
     glRotatef(math.degrees(dome_rotation), 0, 1, 0)
@@ -258,9 +246,7 @@ def render_scene(dome_radius, grid, parabola_range, parabola_height):
     glPushMatrix()
     glColor3f(1, 0, 0)
     glPointSize(10)
-    glBegin(GL_POINTS)
-    glVertex3f(0, dome_radius, 0)
-    glEnd()
+    dome_scenery.draw_apex(dome_radius)
     glPopMatrix()
 
 # -------------------------------
@@ -270,7 +256,9 @@ def main():
     global dome_rotation, rotating, prev_mouse_x, zoom_factor, camera_yaw, camera_pitch
     pygame.init()
     pygame.display.set_mode((window_width, window_height), DOUBLEBUF | OPENGL)
+    startup.mark("GL context")
     pygame.display.set_caption("Dome with Randomized Parabolic Trajectories and Solid Angle Lines")
+    feed.start()
     glEnable(GL_DEPTH_TEST)
     glClearColor(0, 0, 0, 1)
     
@@ -284,10 +272,13 @@ def main():
     parabola_slider = Slider(10, 70, 200, 20, 50, 300, 100)
     parabola_height_slider = Slider(10, 100, 200, 20, 10, 200, 50)
 
-    clock = pygame.time.Clock()
+    # Only redraw when the camera, the input or an animation changed something.
+    redraw = RedrawScheduler(max_fps=30)
+    redraw.watch("camera frame", lambda: feed.frames_captured)
+    redraw.watch("blink", lambda: pygame.time.get_ticks() // 200 % 2)
     running = True
     while running:
-        for event in pygame.event.get():
+        for event in redraw.events():
             if event.type == QUIT:
                 running = False
 
@@ -336,8 +327,16 @@ def main():
         parabola_range = parabola_slider.value
         parabola_height = parabola_height_slider.value
 
+        if not redraw.due():
+            continue
+
+        frame_stages.frame_begin()
         render_scene(dome_radius, grid, parabola_range, parabola_height)
         pygame.display.flip()
+        frame_stages.frame_end()
+        feed.frame_presented()
+        if feed_texture.uploads and startup.mark("first live texture"):
+            startup.report()
 
         # Draw sliders over the OpenGL view.
         surface = pygame.display.get_surface()
@@ -346,8 +345,11 @@ def main():
         parabola_slider.draw()
         parabola_height_slider.draw()
 
-        clock.tick(30)
-
+    print("Dome LOD:", dome_lod.stats())
+    print("Frame stages (ms):", frame_stages.stats())
+    print("Redraw:", redraw.stats())
+    print("Trajectories:", trajectory_batch.stats(), trajectory_store.stats())
+    feed.stop()
     cap.release()
     pygame.quit()
 
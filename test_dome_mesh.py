@@ -0,0 +1,39 @@
+import numpy as np
+
+from dome_mesh import DomeLOD, open_dome_mesh
+
+RADIUS = 300
+
+# -------------------------------
+# Clusters on the side of the dome away from eye.
+# -------------------------------
+def far_wall(mesh, eye):
+    direction = np.array([eye[0], 0.0, eye[2]])
+    direction /= np.linalg.norm(direction)
+    return (mesh.cluster_count > 0) & (mesh.cluster_centre @ direction < -0.5 * mesh.radius)
+
+def test_far_wall_visible_from_inside():
+    for kind in ("patches", "latlong", "icosphere"):
+        mesh = open_dome_mesh(kind).get(RADIUS, 20 if kind == "patches" else 3)
+        for eye in ([0, 150, 0], [0, 150, 150], [0, 50, -200], [0, 1, 299]):
+            eye = np.array(eye, dtype=np.float32)
+            back = mesh.back_facing(eye)
+            assert not back.any(), (kind, eye, np.flatnonzero(back))
+
+def test_far_wall_culled_from_outside():
+    for kind in ("patches", "latlong", "icosphere"):
+        mesh = open_dome_mesh(kind).get(RADIUS, 20 if kind == "patches" else 3)
+        eye = np.array([0, 200, -1200], dtype=np.float32)
+        back = mesh.back_facing(eye)
+        assert back[far_wall(mesh, eye)].all(), kind
+        assert not back[far_wall(mesh, -eye * [1, -1, 1])].any(), kind
+
+def test_lod_keeps_far_wall_from_inside():
+    lod = DomeLOD("latlong", cull_backfaces=True)
+    lod.set_view((0.0, 50.0, -200.0), 0.0, 45, 600)
+    lod.select(RADIUS, 3)
+    mesh = lod.meshes.get(1.0, lod.level)
+    eye = lod.eye / RADIUS
+    assert lod.inside
+    assert far_wall(mesh, eye).any()
+    assert not mesh.back_facing(eye)[far_wall(mesh, eye)].any()
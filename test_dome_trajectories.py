@@ -0,0 +1,121 @@
+import cv2
+import numpy as np
+
+from dome_capture import ClipCache
+from dome_trajectories import PointRing, bezier_points_at, dome_crossings
+
+SAMPLES = 20001
+
+# -------------------------------
+# First inside stretch of each curve found by sampling it densely, as
+# (t_entry, t_exit) with NaN for curves that never go inside.
+# -------------------------------
+def sampled_crossings(p0, p1, p2, radius, hemisphere=True):
+    t = np.linspace(0.0, 1.0, SAMPLES)
+    point = bezier_points_at(p0, p1, p2, np.tile(t, (len(p0), 1)))
+    inside = np.einsum("...i,...i->...", point, point) <= radius * radius
+    if hemisphere:
+        inside &= point[..., 1] >= 0
+    t_entry = np.full(len(p0), np.nan)
+    t_exit = np.full(len(p0), np.nan)
+    for i, row in enumerate(inside):
+        if not row.any():
+            continue
+        first = np.argmax(row)
+        out = np.flatnonzero(~row[first:])
+        t_entry[i] = t[first]
+        t_exit[i] = t[first + out[0] - 1] if len(out) else 1.0
+    return t_entry, t_exit
+
+def test_crossings_match_dense_sampling():
+    rng = np.random.default_rng(7)
+    p0, p1, p2 = (rng.uniform(-450, 450, (3, 400, 3)) + [0, 100, 0])
+    step = 1.0 / (SAMPLES - 1)
+    for hemisphere in (True, False):
+        t_entry, t_exit = dome_crossings(p0, p1, p2, 300, hemisphere)
+        ref_entry, ref_exit = sampled_crossings(p0, p1, p2, 300, hemisphere)
+        assert (np.isnan(t_entry) == np.isnan(ref_entry)).all()
+        assert not np.isnan(t_entry).all() and not (t_entry == 0).all()
+        hit = ~np.isnan(t_entry)
+        assert np.abs(t_entry - ref_entry)[hit].max() <= step
+        assert np.abs(t_exit - ref_exit)[hit].max() <= step
+
+def test_crossing_starting_inside():
+    # Straight up and out along y: leaves the dome at y = 1.
+    p0, p1, p2 = np.array([[[0.0, 0.2, 0.0]], [[0.0, 1.1, 0.0]], [[0.0, 2.0, 0.0]]])
+    t_entry, t_exit = dome_crossings(p0, p1, p2, 1.0)
+    assert t_entry[0] == 0.0
+    assert abs(t_exit[0] - 0.8 / 1.8) < 1e-9
+
+def test_crossing_tangent_from_outside():
+    # Touch the sphere at t = 0.5 without entering: a double root. The
+    # first is straight, the second arcs down onto the top of the dome.
+    p0 = np.array([[-2.0, 0.6, 0.8], [-0.5, 1.7, 0.0]])
+    p1 = np.array([[0.0, 0.6, 0.8], [0.0, 0.3, 0.0]])
+    p2 = np.array([[2.0, 0.6, 0.8], [0.5, 1.7, 0.0]])
+    t_entry, t_exit = dome_crossings(p0, p1, p2, 1.0)
+    assert np.isnan(t_entry).all() and np.isnan(t_exit).all()
+
+def test_crossing_tangent_from_inside():
+    # Arcs up to touch the top of the dome at t = 0.5 and stays inside.
+    p0, p1, p2 = np.array([[[-0.5, 0.3, 0.0]], [[0.0, 1.7, 0.0]], [[0.5, 0.3, 0.0]]])
+    t_entry, t_exit = dome_crossings(p0, p1, p2, 1.0)
+    assert t_entry[0] == 0.0 and t_exit[0] == 1.0
+
+# -------------------------------
+# PointRing counters.
+# -------------------------------
+def test_ring_counts_overflowing_append():
+    ring = PointRing(4, (1, 0, 0))
+    ring.append(np.zeros((3, 3)), now=0.0)
+    ring.append(np.arange(30).reshape(10, 3), now=1.0)
+    stats = ring.stats()
+    assert stats["appended"] == 13
+    assert stats["overwritten"] == 9
+    assert stats["live"] == 4
+    # The ring keeps the newest rows of the batch, oldest first.
+    assert (ring.points[ring._live(), 0, 0] == [18, 21, 24, 27]).all()
+
+def test_ring_expires_oldest_rows():
+    ring = PointRing(8, (1, 0, 0), width=2, max_age=1.0)
+    for now in range(6):
+        ring.append(np.full((1, 2, 3), now), now=float(now))
+    ring._expire(5.0)
+    stats = ring.stats()
+    assert (stats["live"], stats["expired"], stats["overwritten"]) == (2, 4, 0)
+    assert (ring.points[ring._live(), 0, 0] == [4, 5]).all()
+    ring.append(np.zeros((7, 2, 3)), now=6.0)
+    assert (len(ring), ring.stats()["overwritten"]) == (8, 1)
+
+# -------------------------------
+# ClipCache without a pool: the budget decides which clips are cached, and
+# cursors on one clip do not advance each other.
+# -------------------------------
+def write_clip(path, count, width=32, height=24):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, (width, height))
+    for i in range(count):
+        writer.write(np.full((height, width, 3), i * 5, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+def test_clip_cache_budget_and_cursors(tmp_path):
+    short = write_clip(tmp_path / "short.avi", 5)
+    long = write_clip(tmp_path / "long.avi", 40)
+    cache = ClipCache(budget_mb=32 * 24 * 3 * 8 / (1024 * 1024))
+    assert cache.fits(32, 24, 8) == 32 * 24 * 3 * 8
+    assert cache.fits(32, 24, 9) is None
+
+    clip = cache.load(short)
+    assert clip is not None and clip.loaded and clip.count == 5
+    assert cache.load(long) is None
+    assert cache.load(short) is clip
+    stats = cache.stats()
+    assert (stats["cached"], stats["streamed"], stats["bytes_used"]) == (1, 1, 5 * 32 * 24 * 3)
+
+    first, second = clip.cursor(), clip.cursor()
+    seqs = [first.read()[1] for _ in range(7)]
+    frame, seq = second.read()
+    assert seqs == list(range(1, 8)) and seq == 1
+    assert (frame == clip.frames[0]).all()
+    assert cache.stats()["hits"] == 8
+    cache.close()
@@ -7,6 +7,15 @@ from OpenGL.GLU import *
 import math
 import os
 import random
+from dome_capture import (ClipCache, LatestFrameReader, SourceOpener, StartupTimeline,
+                          VideoDecodePool)
+from dome_sources import open_recorder
+from dome_texture import FeedAtlas, FeedCache
+from dome_trajectories import PointRing, bezier_at, bezier_points, crossing_mask, dome_crossings
+
+# Milestones from process start to the first live camera frame on screen.
+startup = StartupTimeline()
+startup.mark("imports")
 
 # -------------------------------
 # Global parameters
@@ -16,161 +25,188 @@ dome_radius = 300  # Inner dome radius
 video_folder = "/home/sakthees/Videos/chola-domepython/videos"
 video_files = ["tree.mp4", "free.mp4", "sree.mp4"]
 speed_factor = 0.5
+decode_workers = 4     # Video decode processes
+decode_ring_depth = 4  # Frames buffered per video in shared memory
+clip_cache_mb = 512    # Clips that fit are decoded once and looped from RAM
+clip_size = (640, 480) # Larger clips are downscaled to the on-dome texture size
 
 # Camera parameters
 zoom_factor = 1.0
 camera_yaw = 0.0
 camera_pitch = 0.0
 
-# Trajectory data (unchanged from before)
-trajectories = []    # List of (start_point, end_point) tuples for drawn trajectory lines
-dome_hits = []       # Permanent red hit points on the dome when the trajectory first enters
-inside_tracks = []   # Yellow locus for the portion of the trajectory inside the dome
-base_hits = []       # Red points on the base circle of the dome
+# Trajectory data, in bounded rings that fade out and drop old entries
+trajectory_capacity = 500    # Trajectories kept; older ones are overwritten
+trajectory_max_age = 60.0    # Seconds before a trajectory fades out (None keeps them)
+track_points = 50            # Samples per trajectory, at most that many inside the dome
+trajectories = PointRing(trajectory_capacity, (1, 0, 0), width=2, mode=GL_LINES,
+                         max_age=trajectory_max_age)   # Start-to-end trajectory lines
+dome_hits = PointRing(trajectory_capacity, (1, 0, 0), max_age=trajectory_max_age)      # Red hit points on the dome where the trajectory first enters
+inside_tracks = PointRing(trajectory_capacity * track_points, (1, 1, 0),
+                          max_age=trajectory_max_age)  # Yellow locus for the portion of the trajectory inside the dome
+base_hits = PointRing(trajectory_capacity, (1, 0, 0), max_age=trajectory_max_age)      # Red points on the base circle of the dome
 
 # -------------------------------
-# Initialize webcam and video files
+# Initialize video decoders and webcam.
+# Short clips are cached in RAM, the others are decoded in worker processes
+# into shared-memory rings. The pool is created first so the workers are
+# forked before the webcam opens.
+# DOME_VIDEOS (comma-separated) and DOME_CAMERA swap the videos and the webcam
+# for other frame sources, see dome_sources.open_source. Anything that fails
+# to open is reported by main() rather than exiting at import.
 # -------------------------------
-cap_webcam = cv2.VideoCapture(0)
-if not cap_webcam.isOpened():
-    print("Error: Could not open webcam")
-    exit()
+video_paths = [os.path.join(video_folder, vid) for vid in video_files]
+if os.environ.get("DOME_VIDEOS"):
+    video_paths = os.environ["DOME_VIDEOS"].split(",")
+startup_errors = []
+clip_cache = ClipCache(budget_mb=clip_cache_mb, size=clip_size)
+video_pool = VideoDecodePool(video_paths, ring_depth=decode_ring_depth,
+                             workers=decode_workers, clip_cache=clip_cache,
+                             timeline=startup)
+for path in video_pool.failed:
+    startup_errors.append(f"Error: Could not open video {path}")
 
-caps_videos = [cv2.VideoCapture(os.path.join(video_folder, vid)) for vid in video_files]
-for cap in caps_videos:
-    if not cap.isOpened():
-        print(f"Error: Could not open video {cap}")
-        exit()
+# The webcam opens in the background; its atlas cell shows a placeholder
+# until the first frame arrives, and keeps showing it if the webcam fails.
+cap_webcam = SourceOpener(os.environ.get("DOME_CAMERA", "device:0"), name="webcam",
+                          timeline=startup)
+# The webcam is read on its own thread; the renderer only takes the newest frame.
+# DOME_RECORD=session.npy also records the raw webcam frames for replay.
+webcam_recorder = open_recorder(os.environ.get("DOME_RECORD"))
+feed_webcam = LatestFrameReader(cap_webcam, name="webcam", recorder=webcam_recorder,
+                                timeline=startup)
 
-# Generate texture IDs
-texture_webcam = glGenTextures(1)
-texture_videos = glGenTextures(len(caps_videos))
+# Every feed lives in one atlas texture (one cell per source), is read and
+# uploaded once per render tick, and the whole dome draws with one bind.
+feed_atlas = FeedAtlas(cell_width=640, cell_height=480, columns=3, rows=2)
+feeds = FeedCache()
 
 # -------------------------------
-# Function to load a frame into a texture
+# Take the newest webcam frame from the capture thread.
+# Returns None until the first frame has arrived.
 # -------------------------------
-def load_texture(cap, texture_id):
-    ret, frame = cap.read()
-    if not ret:
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Restart video if it ends
-        ret, frame = cap.read()
-    # Use high resolution from webcam if available
-    frame = cv2.flip(frame, 0)
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    frame_data = frame.tobytes()
-    glBindTexture(GL_TEXTURE_2D, texture_id)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, frame.shape[1], frame.shape[0],
-                 0, GL_RGB, GL_UNSIGNED_BYTE, frame_data)
-    return True
+def read_webcam():
+    captured = feed_webcam.latest()
+    if captured is None:
+        return None
+    return captured.image, captured.seq
+
+feeds.add("webcam", read_webcam, stream=feed_atlas.add("webcam"))
+for idx in range(video_pool.count):
+    feeds.add("video%d" % idx, lambda idx=idx: video_pool.read(idx),
+              stream=feed_atlas.add("video%d" % idx))
+
+# Which feed covers which part of the dome:
+#   the top cap (theta below cap_theta) shows the webcam,
+#   the front 90 degrees (|phi| <= 45 degrees) is split into front_segments
+#   video strips (clamped to the videos that opened),
+#   the rest of the dome is untextured and drawn black.
+# Changing the layout, the radius or the atlas layout rebuilds the arrays.
+dome_layout = {"cap_theta": 0.3, "front_half_angle": math.pi / 4, "front_segments": 4}
+
+# Dome vertex arrays, sorted into one contiguous range per feed.
+dome_arrays = None
+dome_arrays_key = None
+
+# Texture coordinates of a quad's corners A, B, C, D (see build_dome_arrays).
+QUAD_CORNER_ST = ((0, 0), (0, 1), (1, 1), (1, 0))
 
 # -------------------------------
-# Draw Dome with Textures
+# Build the dome quads as vertex arrays, grouped by feed.
+# Returns (vertices, texcoords, ranges) where ranges maps each feed name
+# (None for the untextured part) to its (first vertex, vertex count) and
+# the texture coordinates already point into the feed's atlas cell.
 # -------------------------------
-def draw_textured_dome():
+def build_dome_arrays():
     slices, stacks = 30, 15
-    glEnable(GL_TEXTURE_2D)
+    theta = np.arange(stacks + 1) * (math.pi / 2 / stacks)
+    phi = np.arange(slices + 1) * (2 * math.pi / slices)
+    i, j = [a.ravel() for a in np.meshgrid(np.arange(stacks), np.arange(slices), indexing="ij")]
+    # Corners A, B, C, D: (theta0, phi0), (theta1, phi0), (theta1, phi1), (theta0, phi1).
+    corner_theta = theta[np.stack([i, i + 1, i + 1, i], axis=1)]
+    corner_phi = phi[np.stack([j, j, j + 1, j + 1], axis=1)]
+    quads = dome_radius * np.stack([np.sin(corner_theta) * np.cos(corner_phi),
+                                    np.cos(corner_theta),
+                                    np.sin(corner_theta) * np.sin(corner_phi)], axis=-1)
+    
+    # Assign every quad to a feed once, here, instead of per quad per frame.
+    phi_avg = (phi[j] + phi[j + 1]) / 2.0
+    phi_adjusted = np.where(phi_avg > math.pi, phi_avg - 2 * math.pi, phi_avg)
+    half_angle = dome_layout["front_half_angle"]
+    segments = dome_layout["front_segments"]
+    seg_index = ((phi_adjusted + half_angle) / (2 * half_angle) * segments).astype(int)
+    seg_index = np.clip(seg_index, 0, max(video_pool.count - 1, 0))
+    names = ["webcam"] + ["video%d" % idx for idx in range(video_pool.count)]
+    source = np.where(np.abs(phi_adjusted) <= half_angle, 1 + seg_index, -1)
+    source = np.where(theta[i] < dome_layout["cap_theta"], 0, source)
+    # Feeds without an atlas cell fall back to the untextured range (-1).
+    textured = [k for k, name in enumerate(names) if name in feed_atlas.cells]
+    source = np.where(np.isin(source, textured), source, -1)
+    
+    vertices = []
+    texcoords = []
+    ranges = {}
+    first = 0
+    for k in textured + [-1]:
+        name = names[k] if k >= 0 else None
+        selected = quads[source == k]
+        if name is None:
+            corner_uv = np.zeros((4, 2))
+        else:
+            corner_uv = np.array([feed_atlas.uv(name, s, t) for s, t in QUAD_CORNER_ST])
+        vertices.append(selected.reshape(-1, 3))
+        texcoords.append(np.tile(corner_uv, (len(selected), 1)))
+        ranges[name] = (first, len(selected) * 4)
+        first += len(selected) * 4
+    
+    return (np.concatenate(vertices).astype(np.float32),
+            np.concatenate(texcoords).astype(np.float32),
+            ranges)
+
+# -------------------------------
+# Draw Dome with Textures (one atlas bind, one draw call per feed)
+# -------------------------------
+def draw_textured_dome():
+    global dome_arrays, dome_arrays_key
+    key = (dome_radius, feed_atlas.version, tuple(sorted(dome_layout.items())))
+    if dome_arrays_key != key:
+        dome_arrays = build_dome_arrays()
+        dome_arrays_key = key
+    vertices, texcoords, ranges = dome_arrays
+    
     # Disable face culling so textures show on both sides
     glDisable(GL_CULL_FACE)
-    
-    # Loop over stacks and slices to map the dome
-    glBegin(GL_QUADS)
-    for i in range(stacks):
-        theta0 = (i / stacks) * (math.pi / 2)
-        theta1 = ((i + 1) / stacks) * (math.pi / 2)
-        for j in range(slices):
-            phi0 = (j / slices) * 2 * math.pi
-            phi1 = ((j + 1) / slices) * 2 * math.pi
-            
-            # Compute vertices in spherical coordinates
-            xA = dome_radius * math.sin(theta0) * math.cos(phi0)
-            yA = dome_radius * math.cos(theta0)
-            zA = dome_radius * math.sin(theta0) * math.sin(phi0)
-            
-            xB = dome_radius * math.sin(theta1) * math.cos(phi0)
-            yB = dome_radius * math.cos(theta1)
-            zB = dome_radius * math.sin(theta1) * math.sin(phi0)
-            
-            xC = dome_radius * math.sin(theta1) * math.cos(phi1)
-            yC = dome_radius * math.cos(theta1)
-            zC = dome_radius * math.sin(theta1) * math.sin(phi1)
-            
-            xD = dome_radius * math.sin(theta0) * math.cos(phi1)
-            yD = dome_radius * math.cos(theta0)
-            zD = dome_radius * math.sin(theta0) * math.sin(phi1)
-            
-            # Determine which texture to use for this quad:
-            # Convert phi to an adjusted value in [-pi, pi]
-            phi_avg = (phi0 + phi1) / 2.0
-            if phi_avg > math.pi:
-                phi_adjusted = phi_avg - 2 * math.pi
-            else:
-                phi_adjusted = phi_avg
-            
-            # If near the top (small theta) use live webcam feed
-            if theta0 < 0.3:
-                # Use webcam texture
-                load_texture(cap_webcam, texture_webcam)
-                glBindTexture(GL_TEXTURE_2D, texture_webcam)
-            # Else if in front region: |phi_adjusted| <= 45° (pi/4 radians)
-            elif abs(phi_adjusted) <= math.pi/4:
-                # Divide the front region (90° total) into 4 segments (each 22.5°)
-                # Map phi_adjusted from [-pi/4, pi/4] to [0, 1]
-                seg_ratio = (phi_adjusted + (math.pi/4)) / (math.pi/2)
-                seg_index = int(seg_ratio * 4)
-                seg_index = min(max(seg_index, 0), 3)
-                load_texture(caps_videos[seg_index], texture_videos[seg_index])
-                glBindTexture(GL_TEXTURE_2D, texture_videos[seg_index])
-            else:
-                # For the rest of the dome, use a default (black) color
-                glDisable(GL_TEXTURE_2D)
-                glColor3f(0, 0, 0)
-            
-            # Set texture coordinates and specify vertices for the quad
-            if glIsEnabled(GL_TEXTURE_2D):
-                glColor3f(1, 1, 1)
-                glTexCoord2f(0, 0); glVertex3f(xA, yA, zA)
-                glTexCoord2f(0, 1); glVertex3f(xB, yB, zB)
-                glTexCoord2f(1, 1); glVertex3f(xC, yC, zC)
-                glTexCoord2f(1, 0); glVertex3f(xD, yD, zD)
-            else:
-                glVertex3f(xA, yA, zA)
-                glVertex3f(xB, yB, zB)
-                glVertex3f(xC, yC, zC)
-                glVertex3f(xD, yD, zD)
-            
-            # Re-enable texture if it was disabled
-            glEnable(GL_TEXTURE_2D)
-    glEnd()
+    glEnableClientState(GL_VERTEX_ARRAY)
+    glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+    glVertexPointer(3, GL_FLOAT, 0, vertices)
+    glTexCoordPointer(2, GL_FLOAT, 0, texcoords)
+    glEnable(GL_TEXTURE_2D)
+    feed_atlas.bind()
+    glColor3f(1, 1, 1)
+    for name, (first, count) in ranges.items():
+        if name is not None and count:
+            glDrawArrays(GL_QUADS, first, count)
     glDisable(GL_TEXTURE_2D)
+    glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+    # For the rest of the dome, use a default (black) color
+    first, count = ranges[None]
+    glColor3f(0, 0, 0)
+    glDrawArrays(GL_QUADS, first, count)
+    glDisableClientState(GL_VERTEX_ARRAY)
 
 # -------------------------------
-# Draw Trajectories and Hit Points (unchanged)
+# Draw Trajectories and Hit Points (one array draw per ring)
 # -------------------------------
 def draw_trajectories():
-    glColor3f(1, 0, 0)
-    glBegin(GL_LINES)
-    for traj in trajectories:
-        glVertex3fv(traj[0])
-        glVertex3fv(traj[1])
-    glEnd()
+    trajectories.draw()
     
     glPointSize(6)
-    glBegin(GL_POINTS)
-    for hit in dome_hits:
-        glColor3f(1, 0, 0)
-        glVertex3fv(hit)
-    for track in inside_tracks:
-        glColor3f(1, 1, 0)
-        glVertex3fv(track)
-    for base in base_hits:
-        glColor3f(1, 0, 0)
-        glVertex3fv(base)
-    glEnd()
+    dome_hits.draw()
+    inside_tracks.draw()
+    base_hits.draw()
 
 # -------------------------------
-# Generate a Parabolic Trajectory Toward the Dome (unchanged)
+# Generate a Parabolic Trajectory Toward the Dome
 # -------------------------------
 def generate_parabolic_trajectory():
     angle = random.uniform(0, 2 * math.pi)
@@ -189,33 +225,39 @@ def generate_parabolic_trajectory():
     control_z = (start_z + end_z) / 2
     control_y = random.uniform(dome_radius / 2, dome_radius)  # high arch
 
-    points = []
-    num_segments = 50
-    entered_dome = False
-    for t in np.linspace(0, 1, num_segments):
-        bx = (1 - t) ** 2 * start_x + 2 * (1 - t) * t * control_x + t ** 2 * end_x
-        by = (1 - t) ** 2 * start_y + 2 * (1 - t) * t * control_y + t ** 2 * end_y
-        bz = (1 - t) ** 2 * start_z + 2 * (1 - t) * t * control_z + t ** 2 * end_z
-        points.append((bx, by, bz))
-        
-        r = math.sqrt(bx**2 + bz**2)
-        if not entered_dome and r <= dome_radius:
-            dome_hits.append((bx, by, bz))
-            entered_dome = True
-        if r <= dome_radius:
-            inside_tracks.append((bx, by, bz))
+    start = np.array([[start_x, start_y, start_z]])
+    control = np.array([[control_x, control_y, control_z]])
+    end = np.array([[end_x, end_y, end_z]])
+    points = bezier_points(start, control, end, track_points - 1)[0]
+    
+    # Exact entry into (and exit from) the dome hemisphere; the hit point
+    # lies on the dome surface and the track covers the stretch inside.
+    t_entry, t_exit = dome_crossings(start, control, end, dome_radius)
+    if not np.isnan(t_entry[0]):
+        dome_hits.append(bezier_at(start, control, end, t_entry))
+        inside = crossing_mask(t_entry, t_exit, track_points - 1)[0]
+        inside_tracks.append(points[inside])
     
-    base_hits.append(points[-1])
-    trajectories.append((points[0], points[-1]))
+    base_hits.append(points[-1:])
+    trajectories.append(points[[0, -1]])
 
 # -------------------------------
 # Main Loop with Camera Controls (Arrow keys rotate; +/- zoom; Ctrl+Left click to zoom in continuously)
 # -------------------------------
 def main():
     global camera_yaw, camera_pitch, zoom_factor
+    if startup_errors:
+        for error in startup_errors:
+            print(error)
+        feed_webcam.stop()
+        video_pool.close()
+        clip_cache.close()
+        return
     pygame.init()
     screen = pygame.display.set_mode((800, 600), DOUBLEBUF | OPENGL)
+    startup.mark("GL context")
     pygame.display.set_caption("Dome Projection: 4 Videos Front, Webcam Top")
+    feed_webcam.start()
     glEnable(GL_DEPTH_TEST)
     # Disable face culling so both sides are visible
     glDisable(GL_CULL_FACE)
@@ -263,15 +305,26 @@ def main():
         cam_z = distance * math.cos(camera_yaw) * math.cos(camera_pitch)
         gluLookAt(cam_x, cam_y, cam_z, 0, dome_radius/2, 0, 0, 1, 0)
         
+        # Advance every feed exactly once for this frame.
+        feeds.advance()
         draw_textured_dome()
         draw_trajectories()
         
         pygame.display.flip()
+        feed_webcam.frame_presented()
+        if feeds.ready["webcam"] and startup.mark("first live texture"):
+            startup.report()
         clock.tick(30)
     
+    print("Feed decodes per tick:", feeds.stats())
+    print("Video decode pool:", video_pool.stats())
+    print("Clip cache:", clip_cache.stats())
+    print("Trajectory rings:", {"trajectories": trajectories.stats(), "dome_hits": dome_hits.stats(),
+                                "inside_tracks": inside_tracks.stats(), "base_hits": base_hits.stats()})
+    feed_webcam.stop()
     cap_webcam.release()
-    for cap in caps_videos:
-        cap.release()
+    video_pool.close()  # Stops the workers and releases every capture
+    clip_cache.close()
     pygame.quit()
 
 if __name__ == "__main__":